@@ -1,24 +1,2128 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
+from abc import ABC, abstractmethod
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import atexit
+import bisect
+import fcntl
+import functools
+import glob
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import math
+import mmap
+import multiprocessing
 import os
-from typing import List, Dict
+import queue
+import re
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Callable, Iterable, List, Dict, Iterator, NamedTuple, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # responses fall back to the stdlib encoder
+    orjson = None
 
 APP_NAME = "ACEest Fitness & Gym"
 VERSION = "1.3"
 
-app = Flask(__name__)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_CURSOR = 2 ** 63 - 1  # cursors and limits must fit SQLite's 64-bit integers
+MAX_BATCH_ITEMS = 10000
+MAX_MINUTES = 24 * 60
+MAX_BMI_ROWS = 500000
+MAX_MEMBER_ID_LENGTH = 64
+MAX_TYPE_LENGTH = 64  # characters; the segment log stores the UTF-8 type length in 16 bits
+MAX_HISTORY_DAYS = 3660  # /history spans at most about ten years of daily buckets
+MEMBER_SHARDS = 16
+RANGE_CHUNK = 4096  # rows sliced out of the columns at a time when streaming a range
+LATE_INDEX_SIZE = 1024  # out-of-order entries buffered before they are merged into the time index
+
+# calories = MET x 3.5 x weight_kg / 200 x minutes, as in the desktop tracker's add_workout
+MET_VALUES = {
+    "Warm-up": 3,
+    "Workout": 6,
+    "Cool-down": 2.5,
+}
+DEFAULT_MET = 5
+DEFAULT_WEIGHT_KG = 70.0
+MAX_WEIGHT_KG = 500.0
+BMI_CACHE_SIZE = int(os.environ.get("ACEEST_BMI_CACHE_SIZE", "1024"))
+# POST /workouts remembers Idempotency-Keys this long (seconds), the most recent ACEEST_IDEMPOTENCY_KEYS of them
+IDEMPOTENCY_TTL = float(os.environ.get("ACEEST_IDEMPOTENCY_TTL", "300"))
+IDEMPOTENCY_KEYS = int(os.environ.get("ACEEST_IDEMPOTENCY_KEYS", "10000"))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# admission control, off unless set: at most ACEEST_MAX_IN_FLIGHT requests handled at once per server
+# process, and per-client token buckets refilled at ACEEST_CLIENT_RATE requests/s up to ACEEST_CLIENT_BURST
+MAX_IN_FLIGHT = int(os.environ.get("ACEEST_MAX_IN_FLIGHT", "0"))
+CLIENT_RATE = float(os.environ.get("ACEEST_CLIENT_RATE", "0"))
+CLIENT_BURST = int(os.environ.get("ACEEST_CLIENT_BURST", "20"))
+# request header naming the client (e.g. X-Forwarded-For behind an ingress); default the peer address
+CLIENT_HEADER = os.environ.get("ACEEST_CLIENT_HEADER", "")
+ADMISSION_CLIENTS = 10000  # client buckets kept; the least recently seen are dropped first
+ADMISSION_EXEMPT = frozenset({"/health"})  # probes must answer however busy the server is
+BMI_MAX_AGE = 86400  # a BMI for given inputs never changes within a version
+
+# /stats/stream: at most this many delta events per second, shared by all subscribers
+STATS_STREAM_RATE = float(os.environ.get("ACEEST_STATS_STREAM_RATE", "2"))
+SSE_HEARTBEAT = 15.0  # seconds between keep-alive comments on an idle stream
+SSE_QUEUE_SIZE = 64  # events a slow subscriber may lag behind before it is dropped
+
+# PDF reports and charts render on a pool of ACEEST_REPORT_WORKERS processes; each server
+# process accepts at most ACEEST_REPORT_QUEUE unfinished report jobs and answers 503 beyond that
+REPORT_WORKERS = int(os.environ.get("ACEEST_REPORT_WORKERS", "2"))
+REPORT_QUEUE = int(os.environ.get("ACEEST_REPORT_QUEUE", "16"))
+# rendered reports are kept here (an app makes a temporary one when unset); the newest REPORT_KEEP stay
+REPORT_DIR = os.environ.get("ACEEST_REPORT_DIR", "")
+REPORT_KEEP = 256
+REPORT_ID = re.compile(r"[0-9a-f]{32}")
+CHART_CACHE_SIZE = 64  # (member, format) pairs whose latest chart is kept
+CHART_QUEUE = 8  # chart renders in flight per server process; requests for more answer 503
+
+# JSON codec for responses and request bodies: "orjson" when installed, else "stdlib"
+JSON_CODEC = os.environ.get("ACEEST_JSON") or ("orjson" if orjson else "stdlib")
+
+# production serving (see serve()): prefork workers x threads per worker
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+THREADS = int(os.environ.get("ACEEST_THREADS", "4"))
+GRACEFUL_TIMEOUT = int(os.environ.get("ACEEST_GRACEFUL_TIMEOUT", "30"))
+# /stats/stream outside ACEEST_SERVER=async holds a worker thread per stream, so at most this many
+# are open per process (a quarter of the threads by default) and more answer 503, leaving threads for probes
+STATS_STREAMS = int(os.environ.get("ACEEST_STATS_STREAMS", str(max(1, THREADS // 4))))
+# ACEEST_SERVER=async: requests with larger bodies are handled off the event loop
+ASGI_INLINE_BODY = 64 * 1024
+ASGI_CHUNKS_PER_SEND = 256
+# GET routes that take the store's writer lock, wait on the render pool or read report files;
+# like every non-GET request they run off the loop
+ASGI_BLOCKING_PREFIXES = ("/charts/", "/history/", "/reports/")
+# a since/until window is summed over its rows in Python, O(k), so windowed queries run off the loop too
+ASGI_BLOCKING_PARAMS = frozenset({b"since", b"until"})
+# per-worker metric files live here (an app makes a temporary one when there are several workers)
+METRICS_DIR = os.environ.get("ACEEST_METRICS_DIR", "")
+
+# storage backend: "memory" (optionally durable via ACEEST_DATA_DIR) or "sqlite";
+# several workers must share one store, so they default to sqlite
+STORE_BACKEND = os.environ.get("ACEEST_STORE", "")
+# durable mode: set ACEEST_DATA_DIR to persist workouts across restarts
+DATA_DIR = os.environ.get("ACEEST_DATA_DIR", "")
+DB_PATH = os.environ.get("ACEEST_DB_PATH", "")  # default: $ACEEST_DATA_DIR/workouts.db
+FSYNC_POLICY = os.environ.get("ACEEST_FSYNC", "batched")  # always | batched | off
+FSYNC_INTERVAL = float(os.environ.get("ACEEST_FSYNC_INTERVAL", "1.0"))
+
+def _stdlib_dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), sort_keys=sort_keys, default=DefaultJSONProvider.default).encode()
+
+def _orjson_dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+
+# name -> (dumps to compact UTF-8 bytes, loads from str or bytes)
+JSON_CODECS: Dict[str, Tuple[Callable[..., bytes], Callable[[Any], Any]]] = {"stdlib": (_stdlib_dumps, json.loads)}
+if orjson is not None:
+    JSON_CODECS["orjson"] = (_orjson_dumps, orjson.loads)
+if JSON_CODEC not in JSON_CODECS:
+    raise ValueError(f"ACEEST_JSON codec {JSON_CODEC!r} is not available; choose from {sorted(JSON_CODECS)}")
+_dumps, _loads = JSON_CODECS[JSON_CODEC]
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by ``JSON_CODEC``.
+
+    ``jsonify`` and ``request.get_json`` go through the configured codec;
+    output stays compact with sorted keys, like Flask's default provider,
+    and responses are built from the encoded bytes directly.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return _dumps(obj, self.sort_keys).decode()
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return _loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(_dumps(obj, self.sort_keys), mimetype=self.mimetype)
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    """NumPy, imported on first use; None when not installed (callers fall back to pure Python)."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+# (type, minutes, timestamp, member_id); member_id is "" for anonymous sessions and a
+# None timestamp asks the store to stamp the entry when it is written
+Entry = Tuple[str, int, Optional[float], str]
+
+def _kcal_per_kg(kind: str, minutes: int) -> float:
+    """Calories per kg of body weight for one session (multiply by weight)."""
+    return MET_VALUES.get(kind, DEFAULT_MET) * 3.5 / 200 * minutes
+
+class Snapshot(NamedTuple):
+    count: int
+    total_minutes: int
+    type_minutes: Tuple[int, ...]
+    type_calories: Tuple[float, ...]
+    index_ts: array  # timestamps in time order; the first ``indexed`` are valid
+    index_seq: array  # sequence number of each ``index_ts`` entry
+    indexed: int
+    late_ts: array  # out-of-order timestamps not yet merged into the index, sorted
+    late_seq: array
+
+def _parse_ts(value: Any) -> float:
+    """Epoch seconds from a number or an ISO 8601 string (naive means UTC)."""
+    if isinstance(value, bool):
+        raise ValueError("timestamp must not be a boolean")
+    if isinstance(value, (int, float)):
+        try:
+            ts = float(value)
+        except OverflowError:  # an int too large for a float
+            raise ValueError("timestamp is out of range") from None
+    elif isinstance(value, str):
+        try:
+            ts = float(value)
+        except ValueError:
+            dt = datetime.fromisoformat(value)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            try:
+                ts = dt.timestamp()
+            except (OverflowError, OSError):
+                raise ValueError("timestamp is out of range") from None
+    else:
+        raise ValueError("timestamp must be a string or a number")
+    if not math.isfinite(ts):
+        raise ValueError("timestamp must be finite")
+    try:
+        datetime.fromtimestamp(ts, timezone.utc)  # every stored timestamp must render with _iso
+    except (OverflowError, OSError, ValueError):
+        raise ValueError("timestamp is out of range") from None
+    return ts
+
+class LogColumns(NamedTuple):
+    """A replayed segment as columns; ``codes`` and ``member_codes`` index the string tables."""
+    minutes: array
+    ts: array
+    codes: array
+    types: List[str]
+    member_codes: array
+    members: List[str]  # members[0] is "" (anonymous)
+
+    def entries(self) -> Iterator[Entry]:
+        types, members = self.types, self.members
+        for minutes, ts, code, member_code in zip(self.minutes, self.ts, self.codes, self.member_codes):
+            yield types[code], minutes, ts, members[member_code]
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds")
+
+class SegmentLog:
+    """Append-only, length-prefixed binary segment of accepted workouts.
+
+    Layout: an 8-byte header (``MAGIC`` + format version), then one record
+    per workout: ``<II`` (payload length, crc32 of payload) followed by the
+    payload, ``<IdH`` minutes, timestamp and type length, then the UTF-8 type
+    and the UTF-8 member id. Recovery scans a memory-mapped
+    view of the file straight into columns, interning types and member ids
+    as it goes, and truncates a torn or corrupt tail.
+
+    ``fsync`` is ``always`` (fsync on every write), ``batched`` (a background
+    thread fsyncs at most every ``interval`` seconds) or ``off`` (leave it to
+    the OS). Every write reaches the OS before the store acknowledges it.
+    """
+
+    MAGIC = b"ACEW"
+    FORMAT = 3
+    HEADER = struct.Struct("<4sB3x")
+    RECORD = struct.Struct("<II")
+    FIELDS = struct.Struct("<IdH")
+
+    def __init__(self, path: str, fsync: str = "batched", interval: float = 1.0) -> None:
+        if fsync not in ("always", "batched", "off"):
+            raise ValueError(f"unknown fsync policy: {fsync!r}")
+        self.path = path
+        self.fsync = fsync
+        self.interval = interval
+        self._file = None
+        self._dirty = False
+        self._closed = threading.Event()
+        self._syncer_pid = 0
+
+    def replay(self) -> LogColumns:
+        """Read every intact record into columns, then open for appending."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.FORMAT))
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, fmt = self.HEADER.unpack_from(mm, 0)
+            if magic != self.MAGIC or fmt != self.FORMAT:
+                raise RuntimeError(f"{self.path} is not a workout segment (format {self.FORMAT})")
+            size = len(mm)
+            pos = self.HEADER.size
+            rec_size = self.RECORD.size
+            fixed = self.FIELDS.size
+            # record header and fixed fields in one unpack; the fields are only used once the crc matches
+            unpack = struct.Struct(self.RECORD.format + self.FIELDS.format[1:]).unpack_from
+            crc32 = zlib.crc32
+            columns = LogColumns(array("I"), array("d"), array("I"), [], array("I"), [""])
+            add_minutes, add_ts = columns.minutes.append, columns.ts.append
+            add_code, add_member = columns.codes.append, columns.member_codes.append
+            type_codes: Dict[bytes, int] = {}
+            member_codes: Dict[bytes, int] = {b"": 0}
+            view = memoryview(mm)
+            try:
+                while pos + rec_size + fixed <= size:  # anything shorter is a torn tail
+                    length, crc, minutes, ts, type_len = unpack(mm, pos)
+                    start = pos + rec_size
+                    end = start + length
+                    if length < fixed or end > size or crc32(view[start:end]) != crc:
+                        break
+                    split = start + fixed + type_len
+                    raw_type = mm[start + fixed:split]
+                    code = type_codes.get(raw_type)
+                    if code is None:
+                        code = type_codes[raw_type] = len(columns.types)
+                        columns.types.append(raw_type.decode("utf-8"))
+                    raw_member = mm[split:end]
+                    member_code = member_codes.get(raw_member)
+                    if member_code is None:
+                        member_code = member_codes[raw_member] = len(columns.members)
+                        columns.members.append(raw_member.decode("utf-8"))
+                    add_minutes(minutes)
+                    add_ts(ts)
+                    add_code(code)
+                    add_member(member_code)
+                    pos = end
+            finally:
+                view.release()
+        finally:
+            mm.close()
+        if pos < size:
+            os.truncate(self.path, pos)
+        self._open()
+        return columns
+
+    def _open(self) -> None:
+        self._file = open(self.path, "ab")
+
+    def write(self, entries: Iterable[Entry]) -> None:
+        """Append records; the caller (the store's writer lock) serializes calls."""
+        buf = bytearray()
+        for kind, minutes, ts, member in entries:
+            raw_type = kind.encode("utf-8")
+            payload = self.FIELDS.pack(minutes, ts, len(raw_type)) + raw_type + member.encode("utf-8")
+            buf += self.RECORD.pack(len(payload), zlib.crc32(payload))
+            buf += payload
+        self._file.write(buf)
+        self._file.flush()
+        if self.fsync == "always":
+            os.fsync(self._file.fileno())
+        else:
+            self._dirty = True
+            if self.fsync == "batched" and self._syncer_pid != os.getpid():
+                # started lazily so a process forked after recovery gets its own syncer
+                self._syncer_pid = os.getpid()
+                threading.Thread(target=self._sync_loop, name="segment-fsync", daemon=True).start()
+
+    def _sync_loop(self) -> None:
+        while not self._closed.wait(self.interval):
+            if self._dirty:
+                self._dirty = False
+                os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file and not self._file.closed:
+            self._closed.set()
+            self._file.flush()
+            if self.fsync != "off":
+                os.fsync(self._file.fileno())
+            self._file.close()
+
+class WorkoutBackend(ABC):
+    """Storage interface behind the workout routes.
+
+    Entries are append-only and addressed by a 0-based sequence number; each
+    carries an epoch-seconds timestamp and optionally a member id. Time
+    ranges are ``[since, until)``, with ``None`` meaning unbounded.
+    """
+
+    @abstractmethod
+    def append(self, kind: str, minutes: int, ts: Optional[float], member: str = "") -> int:
+        """Store one session and return its sequence number; a None ``ts`` means now."""
+
+    @abstractmethod
+    def extend(self, entries: Iterable[Entry]) -> int:
+        """Store entries as one contiguous run; return the first sequence number."""
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    @abstractmethod
+    def iter_range(self, start: int, stop: int) -> Iterator[Dict]:
+        """Yield the entries with sequence numbers in ``[start, stop)``."""
+
+    @abstractmethod
+    def count_between(self, since: Optional[float], until: Optional[float]) -> int:
+        """Number of entries timestamped in ``[since, until)``."""
+
+    @abstractmethod
+    def iter_between(self, since: Optional[float], until: Optional[float], offset: int, limit: Optional[int]) -> Iterator[Dict]:
+        """Yield entries timestamped in ``[since, until)`` in time order, skipping ``offset``."""
+
+    @abstractmethod
+    def aggregate(self, since: Optional[float] = None, until: Optional[float] = None) -> Dict:
+        """Return ``{"count", "total_minutes", "by_type"}`` over ``[since, until)``."""
+
+    @abstractmethod
+    def member_stats(self, member: str) -> Optional[Dict]:
+        """Return a member's ``{"count", "total_minutes", "by_type"}``, or None if unknown."""
+
+    @abstractmethod
+    def iter_member(self, member: str, offset: int, limit: int) -> Iterator[Dict]:
+        """Yield a member's entries in sequence order, skipping ``offset``."""
+
+    @abstractmethod
+    def weight(self, member: str) -> Optional[float]:
+        """Return a member's recorded body weight, or None if never set."""
+
+    @abstractmethod
+    def set_weight(self, member: str, weight_kg: float) -> None:
+        """Record a member's weight and recompute the calories of their whole history."""
+
+    @abstractmethod
+    def calories(self, member: Optional[str] = None) -> Optional[Dict]:
+        """Return ``{"total_calories", "by_type"}`` for everyone or one member (None if unknown)."""
+
+    @abstractmethod
+    def daily(self, start: int, stop: int) -> Dict[int, Dict]:
+        """Return ``{day: {"count", "total_minutes", "by_type"}}`` for the days in ``[start, stop)`` that have
+        workouts; days count from the epoch in UTC."""
+
+    def slice(self, start: int, stop: int) -> List[Dict]:
+        return list(self.iter_range(start, stop))
+
+    def totals(self) -> Tuple[int, int]:
+        """Return ``(count, total_minutes)``."""
+        agg = self.aggregate()
+        return agg["count"], agg["total_minutes"]
+
+class MemberHistory:
+    __slots__ = ("seqs", "count", "total_minutes", "by_type", "calories", "calories_through")
+
+    def __init__(self) -> None:
+        self.seqs = array("I")
+        self.count = 0
+        self.total_minutes = 0
+        self.by_type: Dict[str, int] = {}
+        self.calories: Dict[str, float] = {}
+        # entries below this seq are already counted by the last recompute
+        self.calories_through = 0
+
+class MemberIndex:
+    """Per-member sequence lists and aggregates, partitioned into shards.
+
+    A member always maps to the same shard and each shard has its own lock,
+    so writers for different members rarely contend and a member lookup
+    costs time proportional to that member's own history.
+    """
+
+    def __init__(self, shards: int = MEMBER_SHARDS) -> None:
+        self._shards: List[Tuple[Dict[str, MemberHistory], threading.Lock]] = [
+            ({}, threading.Lock()) for _ in range(shards)
+        ]
+
+    def _shard(self, member: str) -> Tuple[Dict[str, MemberHistory], threading.Lock]:
+        return self._shards[hash(member) % len(self._shards)]
+
+    def add(self, member: str, seq: int, kind: str, minutes: int, calories: float) -> None:
+        histories, lock = self._shard(member)
+        with lock:
+            history = histories.get(member)
+            if history is None:
+                history = histories[member] = MemberHistory()
+            if history.seqs and history.seqs[-1] > seq:
+                # a concurrent writer for the same member got here first
+                history.seqs.insert(bisect.bisect_left(history.seqs, seq), seq)
+            else:
+                history.seqs.append(seq)
+            history.count += 1
+            history.total_minutes += minutes
+            history.by_type[kind] = history.by_type.get(kind, 0) + minutes
+            if seq >= history.calories_through:
+                history.calories[kind] = history.calories.get(kind, 0.0) + calories
+
+    def install(self, member: str, history: MemberHistory) -> None:
+        """Set a member's whole history at once (bulk recovery into an empty index)."""
+        histories, lock = self._shard(member)
+        with lock:
+            histories[member] = history
+
+    def set_calories(self, member: str, by_type: Dict[str, float], through: int) -> None:
+        """Replace a member's calorie totals with a recompute covering seqs below ``through``."""
+        histories, lock = self._shard(member)
+        with lock:
+            history = histories.get(member)
+            if history is None:
+                history = histories[member] = MemberHistory()
+            history.calories = by_type
+            history.calories_through = through
+
+    def calories(self, member: str) -> Optional[Dict[str, float]]:
+        histories, lock = self._shard(member)
+        with lock:
+            history = histories.get(member)
+            return None if history is None else dict(history.calories)
+
+    def stats(self, member: str) -> Optional[Dict]:
+        histories, lock = self._shard(member)
+        with lock:
+            history = histories.get(member)
+            if history is None:
+                return None
+            return {"count": history.count, "total_minutes": history.total_minutes, "by_type": dict(history.by_type)}
+
+    def seqs(self, member: str, offset: int, limit: int) -> List[int]:
+        histories, lock = self._shard(member)
+        with lock:
+            history = histories.get(member)
+            return [] if history is None else history.seqs[offset:offset + limit].tolist()
+
+class WorkoutStore(WorkoutBackend):
+    """Append-only columnar store for workout sessions.
+
+    Minutes live in an ``array('I')`` column and types are interned into small
+    integer codes (``array('I')``) with a code-to-string table, so an entry
+    costs 8 bytes (plus 8 for its timestamp) instead of a dict and boxed
+    objects. Count, total minutes and per-type minutes are maintained on
+    append. With a ``SegmentLog`` attached, each write is logged before it
+    becomes visible. Member ids are interned like types, and a sharded
+    ``MemberIndex`` keeps each member's history and aggregates; it is updated
+    after the global lock is released.
+
+    Calories are computed at ingest from the member's current weight into an
+    ``array('d')`` column, with per-type totals kept next to the minutes. A
+    weight change recomputes that member's rows, found through the member
+    index, in one NumPy pass, so every row always reflects its member's
+    current weight and replaying the log against the saved weights rebuilds
+    the same state.
+
+    Daily rollups (count, minutes and minutes per type code for each UTC
+    day, only for the types seen that day) are also kept on append, so a
+    per-day history costs one lookup per day asked for. Buckets are updated
+    in place, which keeps the append cheap, so ``daily`` is the exception to
+    the lock-free reads described below: it holds the writer lock while it
+    copies the buckets it returns, for at most ``MAX_HISTORY_DAYS`` lookups.
+
+    A time index (timestamps and sequence numbers sorted by time) answers
+    ``since``/``until`` queries by bisection in O(log n + k). Server-side
+    timestamps are taken under the lock, so they arrive in order and are
+    appended to it. An entry older than the newest indexed one goes into a
+    small sorted side buffer (copied on write, at most ``LATE_INDEX_SIZE``
+    entries) that range queries merge in; a full buffer is merged into fresh
+    index arrays, so published index arrays are never changed below their
+    published length.
+
+    Concurrency model: writers serialize on a single lock. Sequence numbers,
+    the log order and the time index are global, so appends need one writer
+    at a time and the write path is not partitioned; only the member index
+    is, which keeps its upkeep (a shard lock per member write, plus the
+    ``_unindexed`` bookkeeping that lets ``set_weight`` find rows the index
+    has not got yet) outside the writer lock. Batching writes through
+    ``extend`` is the way to cut contention. After each write
+    (or each batch) the writer publishes an immutable ``Snapshot`` by a single
+    reference assignment. Readers never take the lock; they read the current
+    snapshot and only look at rows below its ``count``, which are never
+    modified again, so a reader always sees one consistent state and never
+    holds up a writer. The calorie column is the one exception: a weight
+    change rewrites that member's rows in place, and a reader may see some of
+    them before and some after the change. Calorie totals come from the
+    snapshot and the member index, which change in one step.
+    """
+
+    def __init__(self) -> None:
+        self._minutes = array("I")
+        self._codes = array("I")
+        self._ts = array("d")
+        self._member_codes = array("I")
+        self._members: List[str] = [""]
+        self._member_index: Dict[str, int] = {"": 0}
+        self.members = MemberIndex()
+        self._types: List[str] = []
+        self._type_index: Dict[str, int] = {}
+        self._type_minutes: List[int] = []
+        self._total_minutes = 0
+        self._calories = array("d")
+        self._type_calories: List[float] = []
+        self._weights: Dict[str, float] = {}
+        self.weights_path: Optional[str] = None
+        self._days: Dict[float, List] = {}  # ts // 86400 -> [count, minutes, {type code: minutes}]
+        self._index_ts = array("d")
+        self._index_seq = array("I")
+        self._late_ts = array("d")
+        self._late_seq = array("I")
+        self._late_copied = False
+        self._lock = threading.Lock()
+        # first seq of each write whose rows are not all in the member index yet
+        self._unindexed: set = set()
+        self._unindexed_lock = threading.Lock()
+        self._snapshot = Snapshot(0, 0, (), (), self._index_ts, self._index_seq, 0, self._late_ts, self._late_seq)
+        self.log: Optional[SegmentLog] = None
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.iter_range(0, len(self))
+
+    @property
+    def total_minutes(self) -> int:
+        return self._snapshot.total_minutes
+
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
+
+    def totals(self) -> Tuple[int, int]:
+        snap = self._snapshot
+        return snap.count, snap.total_minutes
+
+    def _intern(self, kind: str) -> int:
+        code = self._type_index.get(kind)
+        if code is None:
+            code = len(self._types)
+            self._types.append(kind)
+            self._type_index[kind] = code
+            self._type_minutes.append(0)
+            self._type_calories.append(0.0)
+        return code
+
+    def _append_locked(self, kind: str, minutes: int, ts: float, member: str) -> float:
+        seq = len(self._minutes)
+        code = self._intern(kind)
+        member_code = self._member_index.get(member)
+        if member_code is None:
+            member_code = self._member_index[member] = len(self._members)
+            self._members.append(member)
+        self._codes.append(code)
+        self._minutes.append(minutes)
+        self._ts.append(ts)
+        self._member_codes.append(member_code)
+        calories = _kcal_per_kg(kind, minutes) * self._weights.get(member, DEFAULT_WEIGHT_KG)
+        self._calories.append(calories)
+        self._type_minutes[code] += minutes
+        self._type_calories[code] += calories
+        self._total_minutes += minutes
+        bucket = self._days.get(ts // 86400)
+        if bucket is None:
+            bucket = self._days[ts // 86400] = [0, 0, {}]
+        bucket[0] += 1
+        bucket[1] += minutes
+        by_code = bucket[2]
+        by_code[code] = by_code.get(code, 0) + minutes
+        if not self._index_ts or ts >= self._index_ts[-1]:
+            self._index_ts.append(ts)
+            self._index_seq.append(seq)
+            return calories
+        if not self._late_copied:
+            self._late_ts = array("d", self._late_ts)
+            self._late_seq = array("I", self._late_seq)
+            self._late_copied = True
+        pos = bisect.bisect_right(self._late_ts, ts)
+        self._late_ts.insert(pos, ts)
+        self._late_seq.insert(pos, seq)
+        if len(self._late_ts) >= LATE_INDEX_SIZE:
+            self._merge_late_locked()
+        return calories
+
+    def _merge_late_locked(self) -> None:
+        """Merge the late buffer into fresh index arrays; O(n) once per ``LATE_INDEX_SIZE`` late entries."""
+        index_ts, index_seq = array("d"), array("I")
+        pos = 0
+        for ts, seq in zip(self._late_ts, self._late_seq):
+            cut = bisect.bisect_right(self._index_ts, ts, pos)
+            index_ts.extend(self._index_ts[pos:cut])
+            index_seq.extend(self._index_seq[pos:cut])
+            index_ts.append(ts)
+            index_seq.append(seq)
+            pos = cut
+        index_ts.extend(self._index_ts[pos:])
+        index_seq.extend(self._index_seq[pos:])
+        self._index_ts, self._index_seq = index_ts, index_seq
+        self._late_ts, self._late_seq = array("d"), array("I")
+        self._late_copied = True
+
+    def _publish_locked(self) -> None:
+        self._snapshot = Snapshot(
+            len(self._minutes), self._total_minutes, tuple(self._type_minutes), tuple(self._type_calories),
+            self._index_ts, self._index_seq, len(self._index_ts), self._late_ts, self._late_seq,
+        )
+        self._late_copied = False
+
+    def append(self, kind: str, minutes: int, ts: Optional[float], member: str = "") -> int:
+        with self._lock:
+            if ts is None:
+                ts = time.time()  # under the lock, so server-stamped entries reach the index in order
+            if self.log:
+                self.log.write([(kind, minutes, ts, member)])
+            calories = self._append_locked(kind, minutes, ts, member)
+            self._publish_locked()
+            seq = len(self._minutes) - 1
+            if member:
+                with self._unindexed_lock:
+                    self._unindexed.add(seq)
+        if member:
+            self.members.add(member, seq, kind, minutes, calories)
+            with self._unindexed_lock:
+                self._unindexed.discard(seq)
+        return seq
+
+    def extend(self, entries: Iterable[Entry]) -> int:
+        owned = []
+        with self._lock:
+            now = time.time()
+            if self.log:
+                entries = [(kind, minutes, now if ts is None else ts, member) for kind, minutes, ts, member in entries]
+                self.log.write(entries)
+            first = len(self._minutes)
+            for seq, (kind, minutes, ts, member) in enumerate(entries, first):
+                calories = self._append_locked(kind, minutes, now if ts is None else ts, member)
+                if member:
+                    owned.append((member, seq, kind, minutes, calories))
+            self._publish_locked()
+            if owned:
+                with self._unindexed_lock:
+                    self._unindexed.add(first)
+        for args in owned:
+            self.members.add(*args)
+        if owned:
+            with self._unindexed_lock:
+                self._unindexed.discard(first)
+        return first
+
+    def load(self, columns: LogColumns) -> None:
+        """Bulk-load a replayed log into an empty store.
+
+        With NumPy the columns are adopted as they are and the aggregates,
+        day buckets, time index and member histories are built in a few
+        vectorized passes (the same values ``extend`` would compute, row by
+        row); without it the rows go through ``extend``.
+        """
+        np = _numpy()
+        if np is None:
+            self.extend(columns.entries())
+            return
+        with self._lock:
+            if len(self._minutes):
+                raise RuntimeError("load() needs an empty store")
+            n = len(columns.minutes)
+            width = len(columns.types)
+            self._minutes, self._ts, self._codes = columns.minutes, columns.ts, columns.codes
+            self._member_codes = columns.member_codes
+            self._types = list(columns.types)
+            self._type_index = {kind: code for code, kind in enumerate(self._types)}
+            self._members = list(columns.members)
+            self._member_index = {member: code for code, member in enumerate(self._members)}
+            if not n:
+                self._type_minutes = [0] * width
+                self._type_calories = [0.0] * width
+                self._publish_locked()
+                return
+            minutes = np.frombuffer(columns.minutes, dtype=np.uint32).astype(np.int64)
+            ts = np.frombuffer(columns.ts, dtype=np.float64)
+            codes = np.frombuffer(columns.codes, dtype=np.uint32).astype(np.intp)
+            member_codes = np.frombuffer(columns.member_codes, dtype=np.uint32).astype(np.intp)
+            # same operand order as _kcal_per_kg(kind, minutes) * weight, so the values match exactly
+            per_kg = np.array([_kcal_per_kg(kind, 1) for kind in self._types], dtype=np.float64)
+            weights = np.array([self._weights.get(m, DEFAULT_WEIGHT_KG) for m in self._members], dtype=np.float64)
+            calories = per_kg[codes] * minutes * weights[member_codes]
+            self._calories = array("d", calories.tobytes())
+            self._type_minutes = [int(v) for v in np.bincount(codes, weights=minutes, minlength=width)]
+            self._type_calories = np.bincount(codes, weights=calories, minlength=width).tolist()
+            self._total_minutes = int(minutes.sum())
+
+            days, day_of_row = np.unique(np.floor_divide(ts, 86400), return_inverse=True)
+            day_counts = np.bincount(day_of_row)
+            day_minutes = np.bincount(day_of_row, weights=minutes)
+            buckets = [[int(c), int(m), {}] for c, m in zip(day_counts, day_minutes)]
+            pairs, pair_of_row = np.unique(day_of_row * width + codes, return_inverse=True)
+            pair_minutes = np.bincount(pair_of_row, weights=minutes)
+            for pair, total in zip(pairs.tolist(), pair_minutes.tolist()):
+                buckets[pair // width][2][pair % width] = int(total)
+            self._days = dict(zip(days.tolist(), buckets))
+
+            order = np.argsort(ts, kind="stable")
+            self._index_ts = array("d", ts[order].tobytes())
+            self._index_seq = array("I", order.astype(np.uint32).tobytes())
+            self._late_ts, self._late_seq = array("d"), array("I")
+
+            owned = member_codes > 0
+            if owned.any():
+                order = np.flatnonzero(owned)  # seqs in order, then grouped by member
+                order = order[np.argsort(member_codes[order], kind="stable")]
+                owners, starts, sizes = np.unique(member_codes[order], return_index=True, return_counts=True)
+                histories = {}
+                for owner, start, size in zip(owners.tolist(), starts.tolist(), sizes.tolist()):
+                    history = histories[owner] = MemberHistory()
+                    history.seqs = array("I", order[start:start + size].astype(np.uint32).tobytes())
+                    history.count = size
+                pairs, pair_of_row = np.unique(member_codes[order] * width + codes[order], return_inverse=True)
+                pair_minutes = np.bincount(pair_of_row, weights=minutes[order])
+                pair_calories = np.bincount(pair_of_row, weights=calories[order])
+                for pair, total, kcal in zip(pairs.tolist(), pair_minutes.tolist(), pair_calories.tolist()):
+                    history = histories[pair // width]
+                    kind = self._types[pair % width]
+                    history.total_minutes += int(total)
+                    history.by_type[kind] = int(total)
+                    history.calories[kind] = kcal
+                for owner, history in histories.items():
+                    self.members.install(self._members[owner], history)
+            self._publish_locked()
+
+    def get(self, seq: int) -> Dict:
+        if not 0 <= seq < len(self):
+            raise IndexError(seq)
+        return {
+            "type": self._types[self._codes[seq]],
+            "minutes": self._minutes[seq],
+            "timestamp": _iso(self._ts[seq]),
+            "member_id": self._members[self._member_codes[seq]] or None,
+            "calories": round(self._calories[seq], 2),
+        }
+
+    def iter_range(self, start: int, stop: int) -> Iterator[Dict]:
+        stop = min(stop, len(self))
+        types, members = self._types, self._members
+        # slice a chunk at a time, so a long stream holds RANGE_CHUNK rows of copies, not the whole range
+        for lo in range(start, stop, RANGE_CHUNK):
+            hi = min(stop, lo + RANGE_CHUNK)
+            columns = zip(
+                self._codes[lo:hi], self._minutes[lo:hi], self._ts[lo:hi],
+                self._member_codes[lo:hi], self._calories[lo:hi],
+            )
+            for code, minutes, ts, member_code, calories in columns:
+                yield {
+                    "type": types[code], "minutes": minutes, "timestamp": _iso(ts),
+                    "member_id": members[member_code] or None, "calories": round(calories, 2),
+                }
+
+    @staticmethod
+    def _bounds(ts: array, n: int, since: Optional[float], until: Optional[float]) -> Tuple[int, int]:
+        lo = 0 if since is None else bisect.bisect_left(ts, since, 0, n)
+        hi = n if until is None else bisect.bisect_left(ts, until, lo, n)
+        return lo, max(lo, hi)
+
+    def _windows(self, snap: Snapshot, since: Optional[float], until: Optional[float]) -> Tuple[int, int, int, int]:
+        """``[lo, hi)`` in the time index and ``[late_lo, late_hi)`` in the late buffer."""
+        return (*self._bounds(snap.index_ts, snap.indexed, since, until),
+                *self._bounds(snap.late_ts, len(snap.late_ts), since, until))
+
+    def count_between(self, since: Optional[float], until: Optional[float]) -> int:
+        lo, hi, late_lo, late_hi = self._windows(self._snapshot, since, until)
+        return hi - lo + late_hi - late_lo
+
+    def iter_between(self, since: Optional[float], until: Optional[float], offset: int, limit: Optional[int]) -> Iterator[Dict]:
+        snap = self._snapshot
+        lo, hi, late_lo, late_hi = self._windows(snap, since, until)
+        if late_lo == late_hi:
+            start = lo + offset
+            seqs: Iterable[int] = snap.index_seq[start:hi if limit is None else min(hi, start + limit)]
+        else:
+            merged = heapq.merge(
+                zip(snap.index_ts[lo:hi], snap.index_seq[lo:hi]),
+                zip(snap.late_ts[late_lo:late_hi], snap.late_seq[late_lo:late_hi]),
+            )
+            seqs = (seq for _, seq in itertools.islice(merged, offset, None if limit is None else offset + limit))
+        for seq in seqs:
+            yield self.get(seq)
+
+    def member_stats(self, member: str) -> Optional[Dict]:
+        return self.members.stats(member)
+
+    def daily(self, start: int, stop: int) -> Dict[int, Dict]:
+        buckets = []
+        with self._lock:  # buckets change in place; see the class docstring
+            for day in range(start, stop):
+                bucket = self._days.get(day)  # keys are float day numbers; equal ints find them
+                if bucket is not None:
+                    buckets.append((day, bucket[0], bucket[1], list(bucket[2].items())))
+        types = self._types
+        return {
+            day: {"count": count, "total_minutes": minutes, "by_type": {types[c]: m for c, m in by_code}}
+            for day, count, minutes, by_code in buckets
+        }
+
+    def iter_member(self, member: str, offset: int, limit: int) -> Iterator[Dict]:
+        for seq in self.members.seqs(member, offset, limit):
+            yield self.get(seq)
+
+    def weight(self, member: str) -> Optional[float]:
+        return self._weights.get(member)
+
+    def load_weights(self, path: str) -> None:
+        """Read saved member weights (before the log is replayed) and save future changes there."""
+        self.weights_path = path
+        try:
+            with open(path) as f:
+                self._weights = json.load(f)
+        except FileNotFoundError:
+            pass
+
+    def _save_weights_locked(self) -> None:
+        tmp = self.weights_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._weights, f)
+            f.flush()
+            if self.log and self.log.fsync != "off":
+                os.fsync(f.fileno())
+        os.replace(tmp, self.weights_path)
+
+    def set_weight(self, member: str, weight_kg: float) -> None:
+        with self._lock:
+            self._weights[member] = weight_kg
+            if self.weights_path:
+                self._save_weights_locked()
+            code = self._member_index.get(member)
+            if code is None:
+                return
+            n = len(self._minutes)
+            by_type: Dict[str, float] = {}
+            for type_code, old, new in self._recompute_locked(member, code, n, weight_kg):
+                self._type_calories[type_code] += new - old
+                by_type[self._types[type_code]] = new
+            self._publish_locked()
+            # the member index may still be waiting on rows below n; they are
+            # covered by this recompute and must not add their calories again
+            self.members.set_calories(member, by_type, n)
+
+    def _member_rows_locked(self, member: str, member_code: int, n: int) -> List[int]:
+        """The member's seqs below ``n``: from the member index, plus a scan of rows it may not have yet."""
+        with self._unindexed_lock:
+            floor = min(self._unindexed, default=n)
+        # every write that started below floor has finished adding its rows to the member index
+        seqs = self.members.seqs(member, 0, n)
+        del seqs[bisect.bisect_left(seqs, floor):]
+        member_codes = self._member_codes
+        seqs.extend(seq for seq in range(floor, n) if member_codes[seq] == member_code)
+        return seqs
+
+    def _recompute_locked(self, member: str, member_code: int, n: int, weight_kg: float) -> List[Tuple[int, float, float]]:
+        """Rewrite a member's calorie rows; return ``(type_code, old_total, new_total)`` per type."""
+        rows = self._member_rows_locked(member, member_code, n)
+        np = _numpy()
+        if np is not None:
+            seqs = np.array(rows, dtype=np.intp)
+            codes = np.frombuffer(self._codes, dtype=np.uint32, count=n)[seqs]
+            minutes = np.frombuffer(self._minutes, dtype=np.uint32, count=n)[seqs]
+            old = np.frombuffer(self._calories, dtype=np.float64, count=n)[seqs]
+            mets = np.array([MET_VALUES.get(t, DEFAULT_MET) for t in self._types], dtype=np.float64)
+            new = mets[codes] * (3.5 / 200) * minutes * weight_kg
+            # write through a view, dropped before the lock is released so appends can resize the array
+            view = np.frombuffer(self._calories, dtype=np.float64, count=n)
+            view[seqs] = new
+            del view
+            width = len(self._types)
+            old_totals = np.bincount(codes, weights=old, minlength=width)
+            new_totals = np.bincount(codes, weights=new, minlength=width)
+            present = np.bincount(codes, minlength=width)
+            return [(int(c), float(old_totals[c]), float(new_totals[c])) for c in np.flatnonzero(present)]
+        totals: Dict[int, List[float]] = {}
+        for seq in rows:
+            code = self._codes[seq]
+            value = _kcal_per_kg(self._types[code], self._minutes[seq]) * weight_kg
+            pair = totals.setdefault(code, [0.0, 0.0])
+            pair[0] += self._calories[seq]
+            pair[1] += value
+            self._calories[seq] = value
+        return [(code, old, new) for code, (old, new) in totals.items()]
+
+    def calories(self, member: Optional[str] = None) -> Optional[Dict]:
+        if member is None:
+            by_type = dict(zip(self._types, self._snapshot.type_calories))
+        else:
+            by_type = self.members.calories(member)
+            if by_type is None:
+                if member not in self._weights:
+                    return None
+                by_type = {}
+        return {"total_calories": round(sum(by_type.values()), 2), "by_type": {k: round(v, 2) for k, v in by_type.items()}}
+
+    def by_type(self, snap: Optional[Snapshot] = None) -> Dict[str, int]:
+        snap = snap or self._snapshot
+        return dict(zip(self._types, snap.type_minutes))
+
+    def aggregate(self, since: Optional[float] = None, until: Optional[float] = None) -> Dict:
+        """Count, total minutes and per-type minutes over ``[since, until)``.
+
+        The all-time answer comes from the published snapshot; a time range
+        is bisected in the time index and summed over its k entries.
+        """
+        snap = self._snapshot
+        if since is None and until is None:
+            return {"count": snap.count, "total_minutes": snap.total_minutes, "by_type": self.by_type(snap)}
+        lo, hi, late_lo, late_hi = self._windows(snap, since, until)
+        codes, minutes = self._codes, self._minutes
+        per_code: Dict[int, int] = {}
+        for seq in itertools.chain(snap.index_seq[lo:hi], snap.late_seq[late_lo:late_hi]):
+            code = codes[seq]
+            per_code[code] = per_code.get(code, 0) + minutes[seq]
+        return {
+            "count": hi - lo + late_hi - late_lo,
+            "total_minutes": sum(per_code.values()),
+            "by_type": {self._types[c]: m for c, m in per_code.items()},
+        }
+
+# UTC day number of an epoch-seconds SQL expression, floored like ``ts // 86400``
+DAY_OF_TS = "(CAST({ts} / 86400 AS INTEGER) - ({ts} < CAST({ts} / 86400 AS INTEGER) * 86400))"
+
+class SQLiteStore(WorkoutBackend):
+    """SQLite-backed workout store.
+
+    The database runs in WAL mode so readers never block the writer. Each
+    thread gets its own pooled connection (reopened after a fork, and closed
+    once its thread has exited, when the next thread connects), and the
+    fixed SQL text below is compiled once per connection by sqlite3's
+    statement cache. ``seq`` is the rowid minus one; rows are never deleted.
+    Time-range queries use the ``ts`` index and member queries the
+    ``(member_id, type, minutes)`` index; a trigger keeps per-day rollups in
+    the ``daily`` table. Calories are computed on insert from
+    the ``members`` weight table and recomputed per member when it changes.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS workouts ("
+        " id INTEGER PRIMARY KEY, type TEXT NOT NULL, minutes INTEGER NOT NULL, ts REAL NOT NULL,"
+        " member_id TEXT NOT NULL DEFAULT '', calories REAL NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS members (member_id TEXT PRIMARY KEY, weight_kg REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_workouts_type ON workouts (type, minutes)",
+        "CREATE INDEX IF NOT EXISTS idx_workouts_ts ON workouts (ts)",
+        "CREATE INDEX IF NOT EXISTS idx_workouts_member ON workouts (member_id, type, minutes)",
+        # daily rollups, kept by a trigger so every insert path updates them in its own transaction
+        "CREATE TABLE IF NOT EXISTS daily (day INTEGER NOT NULL, type TEXT NOT NULL, count INTEGER NOT NULL,"
+        " minutes INTEGER NOT NULL, PRIMARY KEY (day, type)) WITHOUT ROWID",
+        f"CREATE TRIGGER IF NOT EXISTS workouts_daily AFTER INSERT ON workouts BEGIN"
+        f" INSERT INTO daily (day, type, count, minutes) VALUES ({DAY_OF_TS.format(ts='NEW.ts')}, NEW.type, 1, NEW.minutes)"
+        f" ON CONFLICT (day, type) DO UPDATE SET count = count + 1, minutes = minutes + excluded.minutes; END",
+        # databases written before the rollups existed are backfilled once
+        f"INSERT INTO daily (day, type, count, minutes) SELECT {DAY_OF_TS.format(ts='ts')}, type, COUNT(*), SUM(minutes)"
+        f" FROM workouts WHERE NOT EXISTS (SELECT 1 FROM daily) GROUP BY 1, 2",
+    )
+    COLUMNS = "type, minutes, ts, member_id, calories"
+    # the calories parameter is kcal per kg; the member's weight is looked up in the same statement
+    INSERT = (
+        f"INSERT INTO workouts ({COLUMNS}) VALUES (?, ?, ?, ?, ? * COALESCE("
+        f"(SELECT weight_kg FROM members WHERE member_id = ?), {DEFAULT_WEIGHT_KG}))"
+    )
+    COUNT = "SELECT COALESCE(MAX(id), 0) FROM workouts"
+    RANGE = f"SELECT {COLUMNS} FROM workouts WHERE id > ? AND id <= ? ORDER BY id"
+    STATS = "SELECT type, COUNT(*), SUM(minutes) FROM workouts GROUP BY type"
+    COUNT_BETWEEN = "SELECT COUNT(*) FROM workouts WHERE ts >= ? AND ts < ?"
+    BETWEEN = f"SELECT {COLUMNS} FROM workouts WHERE ts >= ? AND ts < ? ORDER BY ts, id LIMIT ? OFFSET ?"
+    STATS_BETWEEN = "SELECT type, COUNT(*), SUM(minutes) FROM workouts WHERE ts >= ? AND ts < ? GROUP BY type"
+    MEMBER_STATS = "SELECT type, COUNT(*), SUM(minutes) FROM workouts WHERE member_id = ? GROUP BY type"
+    MEMBER_PAGE = f"SELECT {COLUMNS} FROM workouts WHERE member_id = ? ORDER BY id LIMIT ? OFFSET ?"
+    CALORIES = "SELECT type, SUM(calories) FROM workouts GROUP BY type"
+    MEMBER_CALORIES = "SELECT type, SUM(calories) FROM workouts WHERE member_id = ? GROUP BY type"
+    MEMBER_ROWS = "SELECT id, type, minutes FROM workouts WHERE member_id = ?"
+    UPDATE_CALORIES = "UPDATE workouts SET calories = ? WHERE id = ?"
+    WEIGHT = "SELECT weight_kg FROM members WHERE member_id = ?"
+    DAILY = "SELECT day, type, count, minutes FROM daily WHERE day >= ? AND day < ?"
+    SET_WEIGHT = "INSERT INTO members (member_id, weight_kg) VALUES (?, ?) ON CONFLICT (member_id) DO UPDATE SET weight_kg = excluded.weight_kg"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._pool: List[Tuple[threading.Thread, int, sqlite3.Connection]] = []
+        self._pool_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for stmt in self.SCHEMA:
+                conn.execute(stmt)
+
+    def _conn(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=64, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            local.conn, local.pid = conn, os.getpid()
+            with self._pool_lock:
+                # servers that start a thread per request would otherwise keep a connection per request
+                live = []
+                for thread, pid, pooled in self._pool:
+                    if pid != os.getpid():
+                        continue  # the parent's; it closes its own
+                    if thread.is_alive():
+                        live.append((thread, pid, pooled))
+                    else:
+                        pooled.close()
+                live.append((threading.current_thread(), os.getpid(), conn))
+                self._pool = live
+        return local.conn
+
+    @staticmethod
+    def _window(since: Optional[float], until: Optional[float]) -> Tuple[float, float]:
+        return (float("-inf") if since is None else since, float("inf") if until is None else until)
+
+    @staticmethod
+    def _row(kind: str, minutes: int, ts: float, member: str, calories: float) -> Dict:
+        return {
+            "type": kind, "minutes": minutes, "timestamp": _iso(ts),
+            "member_id": member or None, "calories": round(calories, 2),
+        }
+
+    @staticmethod
+    def _params(kind: str, minutes: int, ts: Optional[float], member: str) -> Tuple:
+        return kind, minutes, time.time() if ts is None else ts, member, _kcal_per_kg(kind, minutes), member
+
+    @staticmethod
+    def _aggregate(rows: Iterable[Tuple[str, int, int]]) -> Dict:
+        count = total = 0
+        by_type = {}
+        for kind, n, minutes in rows:
+            count += n
+            total += minutes
+            by_type[kind] = minutes
+        return {"count": count, "total_minutes": total, "by_type": by_type}
+
+    def append(self, kind: str, minutes: int, ts: Optional[float], member: str = "") -> int:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(self.INSERT, self._params(kind, minutes, ts, member))
+        return cur.lastrowid - 1
+
+    def extend(self, entries: Iterable[Entry]) -> int:
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE keeps the run contiguous across connections
+            conn.execute("BEGIN IMMEDIATE")
+            first = conn.execute(self.COUNT).fetchone()[0]
+            conn.executemany(self.INSERT, (self._params(*entry) for entry in entries))
+        return first
+
+    def __len__(self) -> int:
+        return self._conn().execute(self.COUNT).fetchone()[0]
+
+    def iter_range(self, start: int, stop: int) -> Iterator[Dict]:
+        for row in self._conn().execute(self.RANGE, (start, stop)):
+            yield self._row(*row)
+
+    def count_between(self, since: Optional[float], until: Optional[float]) -> int:
+        return self._conn().execute(self.COUNT_BETWEEN, self._window(since, until)).fetchone()[0]
+
+    def iter_between(self, since: Optional[float], until: Optional[float], offset: int, limit: Optional[int]) -> Iterator[Dict]:
+        params = (*self._window(since, until), -1 if limit is None else limit, offset)
+        for row in self._conn().execute(self.BETWEEN, params):
+            yield self._row(*row)
+
+    def aggregate(self, since: Optional[float] = None, until: Optional[float] = None) -> Dict:
+        if since is None and until is None:
+            return self._aggregate(self._conn().execute(self.STATS))
+        return self._aggregate(self._conn().execute(self.STATS_BETWEEN, self._window(since, until)))
+
+    def member_stats(self, member: str) -> Optional[Dict]:
+        agg = self._aggregate(self._conn().execute(self.MEMBER_STATS, (member,)))
+        return agg if agg["count"] else None
+
+    def iter_member(self, member: str, offset: int, limit: int) -> Iterator[Dict]:
+        for row in self._conn().execute(self.MEMBER_PAGE, (member, limit, offset)):
+            yield self._row(*row)
+
+    def weight(self, member: str) -> Optional[float]:
+        row = self._conn().execute(self.WEIGHT, (member,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_weight(self, member: str, weight_kg: float) -> None:
+        conn = self._conn()
+        with conn:
+            # hold the write lock so no insert lands between the read and the update
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(self.SET_WEIGHT, (member, weight_kg))
+            rows = conn.execute(self.MEMBER_ROWS, (member,)).fetchall()
+            if not rows:
+                return
+            ids, kinds, minutes = zip(*rows)
+            np = _numpy()
+            if np is not None:
+                mets = np.array([MET_VALUES.get(k, DEFAULT_MET) for k in kinds], dtype=np.float64)
+                calories = (mets * (3.5 / 200) * np.array(minutes, dtype=np.float64) * weight_kg).tolist()
+            else:
+                calories = [_kcal_per_kg(k, m) * weight_kg for k, m in zip(kinds, minutes)]
+            conn.executemany(self.UPDATE_CALORIES, zip(calories, ids))
+
+    def calories(self, member: Optional[str] = None) -> Optional[Dict]:
+        conn = self._conn()
+        if member is None:
+            rows = conn.execute(self.CALORIES).fetchall()
+        else:
+            rows = conn.execute(self.MEMBER_CALORIES, (member,)).fetchall()
+            if not rows and self.weight(member) is None:
+                return None
+        by_type = {kind: round(total, 2) for kind, total in rows}
+        return {"total_calories": round(sum(total for _, total in rows), 2), "by_type": by_type}
+
+    def daily(self, start: int, stop: int) -> Dict[int, Dict]:
+        out: Dict[int, Dict] = {}
+        for day, kind, count, minutes in self._conn().execute(self.DAILY, (start, stop)):
+            bucket = out.setdefault(day, {"count": 0, "total_minutes": 0, "by_type": {}})
+            bucket["count"] += count
+            bucket["total_minutes"] += minutes
+            bucket["by_type"][kind] = minutes
+        return out
+
+    def close(self) -> None:
+        with self._pool_lock:
+            for _, _, conn in self._pool:
+                conn.close()
+            self._pool.clear()
+
+class RequestMetrics:
+    """Per-route request counters and latency histograms.
+
+    Every thread records into its own shard, so ``observe`` takes no lock;
+    ``snapshot`` merges the shards at scrape time and folds in the shards of
+    threads that have exited. Series are keyed by (route, method, status).
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, Dict]] = []
+        self._retired: Dict[Tuple[str, str, int], List[float]] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def set_counter(self, name: str, value: float) -> None:
+        """Record this process's current value of a counter it tracks itself."""
+        self._counters[name] = value
+
+    def observe(self, route: str, method: str, status: int, seconds: float) -> None:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        series = shard.get((route, method, status))
+        if series is None:
+            # [count, sum, one non-cumulative count per bucket, +Inf]
+            series = shard[(route, method, status)] = [0, 0.0] + [0] * (len(self.BUCKETS) + 1)
+        series[0] += 1
+        series[1] += seconds
+        series[2 + bisect.bisect_left(self.BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> Tuple[Dict[Tuple[str, str, int], List[float]], Dict[str, float]]:
+        """Return the merged request series and the counters."""
+        merged: Dict[Tuple[str, str, int], List[float]] = {}
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    _merge_series(self._retired, shard)
+            self._shards = live
+            _merge_series(merged, self._retired)
+            for _, shard in live:
+                _merge_series(merged, shard)
+        return merged, dict(self._counters)
+
+class MmapedSeries:
+    """Fixed-width float64 series in a memory-mapped file.
+
+    Layout: ``<Q`` bytes used, then entries of ``<I`` key length, the UTF-8
+    key zero-padded to 8 bytes, and ``width`` float64 values. Entries are
+    only appended, so a reader in another process can parse up to the used
+    mark at any time. Writers in one process must hold their own lock.
+    """
+
+    USED = struct.Struct("<Q")
+    KEYLEN = struct.Struct("<I")
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path: str, width: int) -> None:
+        self.path = path
+        self.width = width
+        self._value = struct.Struct(f"<{width}d")
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size < self.USED.size:
+            size = self.INITIAL_SIZE
+            os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, size)
+        self._used = self.USED.unpack_from(self._mm, 0)[0] or self.USED.size
+        self._offsets = {key: offset for key, offset, _ in self._scan(self._mm, self._used, width)}
+
+    @classmethod
+    def _scan(cls, buf, used: int, width: int) -> Iterator[Tuple[str, int, Tuple[float, ...]]]:
+        value = struct.Struct(f"<{width}d")
+        pos = cls.USED.size
+        while pos + cls.KEYLEN.size <= used:
+            (length,) = cls.KEYLEN.unpack_from(buf, pos)
+            offset = pos + 4 + length + (-(4 + length) % 8)
+            if offset + value.size > used:
+                break  # cut short by the caller's clamp to what it has mapped
+            key = bytes(buf[pos + 4:pos + 4 + length]).decode("utf-8")
+            yield key, offset, value.unpack_from(buf, offset)
+            pos = offset + value.size
+
+    @classmethod
+    def read(cls, path: str, width: int) -> List[Tuple[str, Tuple[float, ...]]]:
+        """Snapshot another process's file without taking any of its locks."""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < cls.USED.size:
+                return []
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # the writer may have grown the file and published entries past what was mapped here
+            used = min(cls.USED.unpack_from(mm, 0)[0], len(mm))
+            return [(key, values) for key, _, values in cls._scan(mm, used, width)]
+        finally:
+            mm.close()
+
+    def _slot(self, key: str) -> int:
+        offset = self._offsets.get(key)
+        if offset is None:
+            raw = key.encode("utf-8")
+            offset = self._used + 4 + len(raw) + (-(4 + len(raw)) % 8)
+            end = offset + self._value.size
+            if end > len(self._mm):
+                new_size = max(len(self._mm) * 2, end)
+                os.ftruncate(self._fd, new_size)
+                self._mm.resize(new_size)
+            self.KEYLEN.pack_into(self._mm, self._used, len(raw))
+            self._mm[self._used + 4:self._used + 4 + len(raw)] = raw
+            self._value.pack_into(self._mm, offset, *([0.0] * self.width))
+            # publish the entry only once it is fully written
+            self._used = end
+            self.USED.pack_into(self._mm, 0, end)
+            self._offsets[key] = offset
+        return offset
+
+    def add(self, key: str, index: int, amount: float) -> None:
+        pos = self._slot(key) + 8 * index
+        struct.pack_into("<d", self._mm, pos, struct.unpack_from("<d", self._mm, pos)[0] + amount)
+
+    def set(self, key: str, index: int, value: float) -> None:
+        struct.pack_into("<d", self._mm, self._slot(key) + 8 * index, value)
+
+    def items(self) -> List[Tuple[str, Tuple[float, ...]]]:
+        return [(key, self._value.unpack_from(self._mm, offset)) for key, offset in self._offsets.items()]
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+class MultiprocessMetrics(RequestMetrics):
+    """Request metrics shared by prefork workers through per-process mmap files.
+
+    Each worker writes its series into ``<dir>/metrics_<pid>.db``. A scrape in
+    any worker reads every file and merges them, with no IPC. Files left by
+    workers that have died are folded into ``metrics_archive.db`` (so counters
+    never go backwards) and removed; an ``flock`` keeps two scrapes from
+    folding the same file twice.
+    """
+
+    def __init__(self, directory: str) -> None:
+        super().__init__()
+        self.directory = directory
+        self.width = len(self.BUCKETS) + 3
+        self._file: Optional[MmapedSeries] = None
+        self._pid = 0
+
+    def _own(self) -> MmapedSeries:
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file = MmapedSeries(os.path.join(self.directory, f"metrics_{self._pid}.db"), self.width)
+        return self._file
+
+    def observe(self, route: str, method: str, status: int, seconds: float) -> None:
+        key = json.dumps(["http", route, method, status])
+        with self._lock:
+            own = self._own()
+            own.add(key, 0, 1)
+            own.add(key, 1, seconds)
+            own.add(key, 2 + bisect.bisect_left(self.BUCKETS, seconds), 1)
+
+    def set_counter(self, name: str, value: float) -> None:
+        with self._lock:
+            self._own().set(json.dumps(["counter", name]), 0, value)
+
+    def _merged(self) -> Dict[str, List[float]]:
+        with self._lock:
+            self._own()
+        merged: Dict[str, List[float]] = {}
+        with open(os.path.join(self.directory, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, "metrics_archive.db")
+            for path in glob.glob(os.path.join(self.directory, "metrics_*.db")):
+                if path == archive_path:
+                    continue
+                pid = int(os.path.basename(path)[len("metrics_"):-len(".db")])
+                if pid != os.getpid() and not _pid_alive(pid):
+                    archive = MmapedSeries(archive_path, self.width)
+                    for key, values in MmapedSeries.read(path, self.width):
+                        for i, value in enumerate(values):
+                            archive.add(key, i, value)
+                    archive.close()
+                    os.unlink(path)
+                    continue
+                _merge_series(merged, dict(MmapedSeries.read(path, self.width)))
+            if os.path.exists(archive_path):
+                _merge_series(merged, dict(MmapedSeries.read(archive_path, self.width)))
+        return merged
+
+    def snapshot(self) -> Tuple[Dict[Tuple[str, str, int], List[float]], Dict[str, float]]:
+        series: Dict[Tuple[str, str, int], List[float]] = {}
+        counters: Dict[str, float] = {}
+        for key, values in self._merged().items():
+            kind, *rest = json.loads(key)
+            if kind == "http":
+                route, method, status = rest
+                series[(route, method, status)] = values
+            else:
+                counters[rest[0]] = values[0]
+        return series, counters
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _merge_series(into: Dict, shard: Dict) -> None:
+    for key, series in list(shard.items()):
+        series = list(series)
+        current = into.get(key)
+        if current is None:
+            into[key] = series
+        else:
+            for i, value in enumerate(series):
+                current[i] += value
+
+def _render_http_metrics(series: Dict[Tuple[str, str, int], List[float]], buckets: Tuple[float, ...]) -> str:
+    """Format merged request series in the Prometheus text exposition format."""
+    requests_out = [
+        "# HELP aceest_http_requests_total HTTP requests by route, method and status.",
+        "# TYPE aceest_http_requests_total counter",
+    ]
+    errors_out = [
+        "# HELP aceest_http_request_errors_total HTTP requests answered with a 5xx status.",
+        "# TYPE aceest_http_request_errors_total counter",
+    ]
+    hist_out = [
+        "# HELP aceest_http_request_duration_seconds HTTP request latency by route, method and status.",
+        "# TYPE aceest_http_request_duration_seconds histogram",
+    ]
+    for (route, method, status), values in sorted(series.items()):
+        labels = f'route="{route}",method="{method}",status="{status}"'
+        count = int(values[0])
+        requests_out.append(f"aceest_http_requests_total{{{labels}}} {count}")
+        if status >= 500:
+            errors_out.append(f"aceest_http_request_errors_total{{{labels}}} {count}")
+        cumulative = 0
+        for le, n in zip([repr(b) for b in buckets] + ["+Inf"], values[2:]):
+            cumulative += int(n)
+            hist_out.append(f'aceest_http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        hist_out.append(f"aceest_http_request_duration_seconds_sum{{{labels}}} {values[1]}")
+        hist_out.append(f"aceest_http_request_duration_seconds_count{{{labels}}} {count}")
+    return "\n".join(requests_out + errors_out + hist_out) + "\n"
+
+class StatsBroadcaster:
+    """Pushes ``/stats`` deltas to every ``/stats/stream`` subscriber.
+
+    A single thread per process checks the store length at most ``rate``
+    times per second; when workouts were added it recomputes the aggregate
+    once, keeps only the type totals that changed and encodes that event
+    once for all subscribers, so a burst of writes becomes one event. The
+    length check also sees writes made by other workers to a shared store.
+
+    Subscribers register a non-blocking ``deliver(event) -> bool`` callback;
+    one that returns False (its queue is full) is dropped, and its client
+    reconnects and starts again from a fresh snapshot.
+    """
+
+    def __init__(self, store: WorkoutBackend, rate: float) -> None:
+        self.store = store
+        self.interval = 1.0 / rate
+        self._subscribers: Dict[int, Callable[[bytes], bool]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._last: Optional[Dict] = None
+        self._version = -1
+        self._thread_pid: Optional[int] = None
+
+    @staticmethod
+    def _event(name: str, data: Dict) -> bytes:
+        return f"event: {name}\nid: {data['count']}\ndata: ".encode() + _dumps(data) + b"\n\n"
+
+    def subscribe(self, deliver: Callable[[bytes], bool]) -> Tuple[int, bytes]:
+        """Register ``deliver``; return its token and a snapshot event the deltas build on."""
+        with self._lock:
+            if not self._subscribers:
+                # nobody has been tracking the store; start from its current state
+                self._version = len(self.store)
+                self._last = self.store.aggregate()
+            token = next(self._ids)
+            self._subscribers[token] = deliver
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._run, name="aceest-stats-stream", daemon=True).start()
+            return token, b"retry: 1000\n" + self._event("snapshot", self._last)
+
+    def unsubscribe(self, token: int) -> None:
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def subscribed(self, token: int) -> bool:
+        return token in self._subscribers
 
-# in-memory store (demo purposes)
-workouts: List[Dict] = []
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if self._subscribers:
+                    self._publish_locked()
 
-@app.get("/")
+    def _publish_locked(self) -> None:
+        version = len(self.store)
+        if version == self._version:
+            return
+        agg = self.store.aggregate()
+        previous = self._last["by_type"]
+        changed = {kind: minutes for kind, minutes in agg["by_type"].items() if previous.get(kind) != minutes}
+        event = self._event("delta", {"count": agg["count"], "total_minutes": agg["total_minutes"], "by_type": changed})
+        self._last, self._version = agg, version
+        for token, deliver in list(self._subscribers.items()):
+            if not deliver(event):
+                del self._subscribers[token]
+
+def _weekly_report(workouts: WorkoutBackend, member: str, day: date) -> Optional[Dict]:
+    """Everything the weekly PDF shows for ``member`` in the Monday-to-Sunday (UTC) week of ``day``.
+
+    Returns None for an unknown member. The result is plain data, so it can
+    be hashed into a report id and sent to a pool process.
+    """
+    agg = workouts.member_stats(member)
+    if agg is None:
+        return None
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) - timedelta(days=day.weekday())
+    lo, hi = _iso(start.timestamp()), _iso((start + timedelta(days=7)).timestamp())
+    items = sorted((item for item in workouts.iter_member(member, 0, agg["count"]) if lo <= item["timestamp"] < hi),
+                   key=lambda item: item["timestamp"])
+    return {
+        "version": VERSION,
+        "member_id": member,
+        "weight_kg": workouts.weight(member) or DEFAULT_WEIGHT_KG,
+        "week_start": start.date().isoformat(),
+        "week_end": (start + timedelta(days=6)).date().isoformat(),
+        "rows": [[item["type"], item["minutes"], item["calories"], item["timestamp"][:10]] for item in items],
+    }
+
+def _render_weekly_report(report: Dict) -> bytes:
+    """Draw a ``_weekly_report`` as a PDF, laid out like the desktop tracker's export."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    title = f"Weekly Fitness Report - {report['member_id']}"
+    rows = report["rows"]
+    story = [
+        Paragraph(title, styles["Title"]),
+        Paragraph(f"Regn-ID: {report['member_id']} | Weight: {report['weight_kg']:g} kg", styles["Normal"]),
+        Paragraph(f"Week: {report['week_start']} to {report['week_end']}", styles["Normal"]),
+        Spacer(1, 12),
+    ]
+    if rows:
+        total = ["Total", sum(r[1] for r in rows), round(sum(r[2] for r in rows), 2), ""]
+        table = Table([["Type", "Duration(min)", "Calories(kcal)", "Date"]] + rows + [total],
+                      colWidths=[150, 90, 90, 90], repeatRows=1)
+        table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
+            ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+        ]))
+        story.append(table)
+    else:
+        story.append(Paragraph("No workouts logged this week.", styles["Normal"]))
+    out = io.BytesIO()
+    # invariant: no creation date or random document id, so the same report renders to the same bytes
+    SimpleDocTemplate(out, pagesize=A4, title=title, invariant=1).build(story)
+    return out.getvalue()
+
+def _render_report_file(report: Dict, path: str) -> None:
+    """Pool task: render ``report`` and move the PDF into place at ``path``."""
+    pdf = _render_weekly_report(report)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp, path)
+
+class RenderPool:
+    """Process pool for CPU-heavy rendering, started lazily in the process that uses it.
+
+    Rendering in a pool process keeps matplotlib and ReportLab from holding
+    the server's GIL; a pool broken by a dying process is replaced on the next job.
+    The server is multithreaded by the time it renders, so pool processes are
+    never forked from it: they come from a forkserver (spawned where there is
+    none) and import this module by its name, ``__main__`` when it runs as a
+    script, to find the render functions.
+    """
+
+    START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                try:
+                    return self._pool.submit(fn, *args)
+                except BrokenProcessPool:
+                    pass  # one of its processes died; start a fresh pool
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(self.START_METHOD))
+            self._pool_pid = os.getpid()
+            return self._pool.submit(fn, *args)
+
+class ReportService:
+    """Renders weekly PDF reports on a bounded process pool.
+
+    A report's id is the hash of everything it shows, so asking again while
+    the data is unchanged returns the same id and the PDF already rendered
+    instead of drawing it again. Reports live in ``directory``, which prefork
+    workers share: ``<id>.pdf`` once rendered, ``<id>.pending`` (holding the
+    rendering process's pid) meanwhile and ``<id>.error`` if rendering failed.
+
+    Each process keeps at most ``max_pending`` jobs rendering or queued;
+    ``submit`` answers ``"busy"`` beyond that rather than queueing without
+    bound.
+    """
+
+    def __init__(self, directory: str, pool: RenderPool, max_pending: int, keep: int = REPORT_KEEP) -> None:
+        self.directory = directory
+        self.pool = pool
+        self.max_pending = max_pending
+        self.keep = keep
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        if not self.directory:
+            self.directory = tempfile.mkdtemp(prefix="aceest-reports-")
+        return os.path.join(self.directory, job_id + suffix)
+
+    def submit(self, report: Dict) -> Tuple[str, str]:
+        """Start rendering ``report`` unless it is rendered or rendering; return its id and status."""
+        job_id = hashlib.sha256(_dumps(report, sort_keys=True)).hexdigest()[:32]
+        with self._lock:
+            status = self.status(job_id)[0]
+            if status in ("done", "pending"):
+                return job_id, status
+            if len(self._pending) >= self.max_pending:
+                return job_id, "busy"
+            with open(self._path(job_id, ".pending"), "w") as f:
+                f.write(str(os.getpid()))
+            future = self.pool.submit(_render_report_file, report, self._path(job_id, ".pdf"))
+            self._pending[job_id] = future
+        future.add_done_callback(functools.partial(self._finished, job_id))
+        return job_id, "pending"
+
+    def status(self, job_id: str) -> Tuple[str, Optional[str]]:
+        """``("done", pdf_path)``, ``("pending", None)``, ``("failed", error)`` or ``("unknown", None)``."""
+        pdf = self._path(job_id, ".pdf")
+        if os.path.exists(pdf):
+            return "done", pdf
+        if job_id in self._pending:
+            return "pending", None
+        try:
+            with open(self._path(job_id, ".pending")) as f:
+                if _pid_alive(int(f.read())):
+                    return "pending", None
+        except (OSError, ValueError):
+            pass
+        try:
+            with open(self._path(job_id, ".error")) as f:
+                return "failed", f.read()
+        except OSError:
+            return "unknown", None
+
+    def _finished(self, job_id: str, future: Future) -> None:
+        error = future.exception()
+        with self._lock:
+            self._pending.pop(job_id, None)
+            if error is not None:
+                with open(self._path(job_id, ".error"), "w") as f:
+                    f.write(f"{type(error).__name__}: {error}")
+            else:
+                _remove(self._path(job_id, ".error"))
+            _remove(self._path(job_id, ".pending"))
+            reports = sorted(glob.glob(os.path.join(self.directory, "*.pdf")), key=_mtime, reverse=True)
+            for path in reports[self.keep:]:
+                _remove(path)
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0.0
+
+# the desktop tracker's chart palette
+CHART_COLORS = ["#2196F3", "#4CAF50", "#FFC107"]
+CHART_TEXT = "#343A40"
+
+def _render_progress_chart(by_type: Dict[str, int], fmt: str) -> bytes:
+    """Draw the desktop tracker's progress charts (minutes per type, bar and pie) as PNG or SVG."""
+    import matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 5), dpi=100, facecolor="white")
+    FigureCanvasAgg(fig)
+    categories, values = list(by_type), list(by_type.values())
+    if sum(values) == 0:
+        fig.text(0.5, 0.5, "No workout data logged yet.", ha="center", va="center",
+                 fontsize=14, style="italic", color="#888")
+    else:
+        colors = [CHART_COLORS[i % len(CHART_COLORS)] for i in range(len(categories))]
+        ax1 = fig.add_subplot(121)
+        ax1.bar(categories, values, color=colors)
+        ax1.set_title("Total Minutes per Category", fontsize=10, color=CHART_TEXT)
+        ax1.set_ylabel("Total Minutes", fontsize=8, color=CHART_TEXT)
+        ax1.tick_params(axis="both", labelsize=8, colors=CHART_TEXT)
+        ax1.spines["right"].set_visible(False)
+        ax1.spines["top"].set_visible(False)
+        ax1.grid(axis="y", linestyle="-", alpha=0.3)
+        ax2 = fig.add_subplot(122)
+        shown = [(c, v, color) for c, v, color in zip(categories, values, colors) if v > 0]
+        ax2.pie([v for _, v, _ in shown], labels=[c for c, _, _ in shown], colors=[color for _, _, color in shown],
+                autopct="%1.1f%%", startangle=90, wedgeprops={"edgecolor": "white", "linewidth": 1},
+                textprops={"fontsize": 8, "color": CHART_TEXT})
+        ax2.set_title("Workout Distribution (%)", fontsize=10, color=CHART_TEXT)
+        ax2.axis("equal")
+        fig.suptitle(f"LIFETIME TOTAL: {sum(values)} minutes logged", fontsize=12, fontweight="bold", color="#DC3545")
+        fig.tight_layout(pad=2.0)
+    out = io.BytesIO()
+    # fixed SVG ids and no date, so the same data draws the same bytes (and ETag) in every worker
+    with matplotlib.rc_context({"svg.hashsalt": "aceest"}):
+        fig.savefig(out, format=fmt, metadata={"Date": None} if fmt == "svg" else None)
+    return out.getvalue()
+
+class ChartCache:
+    """Progress charts rendered once per store version.
+
+    The version is the workout count a chart was drawn from: the store is
+    append-only, so an unchanged count means an unchanged chart. Only the
+    latest version of each (member, format) chart is kept, the least
+    recently used pairs are evicted beyond ``size``, and concurrent requests
+    for a chart that is still rendering share the one render. At most
+    ``max_pending`` renders are in flight; ``get`` answers None beyond that
+    rather than queueing without bound.
+    """
+
+    def __init__(self, pool: RenderPool, max_pending: int = CHART_QUEUE, size: int = CHART_CACHE_SIZE) -> None:
+        self.pool = pool
+        self.max_pending = max_pending
+        self.size = size
+        self._charts: Dict[Tuple[Optional[str], str], Tuple[int, Future]] = {}  # insertion order is recency
+        self._rendering = 0
+        self._lock = threading.Lock()
+
+    def get(self, member: Optional[str], fmt: str, version: int, by_type: Dict[str, int]) -> Optional[Future]:
+        """A future for the chart's bytes, submitted to the pool unless this version is cached; None when busy."""
+        key = (member, fmt)
+        with self._lock:
+            cached = self._charts.get(key)
+            if cached is not None and cached[0] == version and not (cached[1].done() and cached[1].exception()):
+                self._charts[key] = self._charts.pop(key)
+                return cached[1]
+            if self._rendering >= self.max_pending:
+                return None
+            future = self.pool.submit(_render_progress_chart, by_type, fmt)
+            self._rendering += 1
+            self._charts.pop(key, None)
+            self._charts[key] = (version, future)
+            if len(self._charts) > self.size:
+                del self._charts[next(iter(self._charts))]
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self._rendering -= 1
+
+class IdempotencyCache:
+    """Recent ``Idempotency-Key``s of ``POST /workouts`` and the bodies of their 201 responses.
+
+    Every key lives for the same ``ttl``, so insertion order is expiry order
+    and one insertion-ordered dict is both the O(1) index and the eviction
+    queue: claiming a key first drops expired keys from the front, then the
+    oldest beyond ``capacity``. Memory stays bounded by ``capacity`` however
+    fast workouts are posted.
+
+    ``claim`` answers ``"new"`` (the caller handles the request, then calls
+    ``complete`` or ``release``), ``"replay"`` with the stored body,
+    ``"busy"`` while the first request is still being handled, or
+    ``"mismatch"`` when the key was used for a different request body.
+    """
+
+    def __init__(self, ttl: float, capacity: int) -> None:
+        self.ttl = ttl
+        self.capacity = capacity
+        self._entries: Dict[str, Tuple[float, bytes, Optional[bytes]]] = {}  # key -> (expires, fingerprint, body)
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, fingerprint: bytes) -> Tuple[str, Optional[bytes]]:
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries
+            while entries:
+                oldest = next(iter(entries))
+                if entries[oldest][0] > now and len(entries) < self.capacity:
+                    break
+                del entries[oldest]
+            entry = entries.get(key)
+            if entry is None:
+                entries[key] = (now + self.ttl, fingerprint, None)
+                return "new", None
+        if entry[1] != fingerprint:
+            return "mismatch", None
+        return ("busy", None) if entry[2] is None else ("replay", entry[2])
+
+    def complete(self, key: str, body: bytes) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], body)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+class SQLiteIdempotency(IdempotencyCache):
+    """``IdempotencyCache`` kept in the SQLite store's database, so every worker sees every key.
+
+    A retry may reach any worker. Claims are atomic across processes (the
+    key is the primary key) and expiry uses wall-clock time; the capacity is
+    enforced every ``PRUNE_EVERY`` claims rather than counting rows each time.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS idempotency (key TEXT PRIMARY KEY, fingerprint BLOB NOT NULL,"
+        " expires REAL NOT NULL, body BLOB)",
+        "CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency (expires)",
+    )
+    EXPIRE = "DELETE FROM idempotency WHERE expires <= ?"
+    CLAIM = "INSERT INTO idempotency (key, fingerprint, expires) VALUES (?, ?, ?) ON CONFLICT (key) DO NOTHING"
+    LOOKUP = "SELECT fingerprint, body FROM idempotency WHERE key = ?"
+    COMPLETE = "UPDATE idempotency SET body = ? WHERE key = ?"
+    RELEASE = "DELETE FROM idempotency WHERE key = ?"
+    PRUNE = ("DELETE FROM idempotency WHERE key IN (SELECT key FROM idempotency ORDER BY expires"
+             " LIMIT MAX(0, (SELECT COUNT(*) FROM idempotency) - ?))")
+    PRUNE_EVERY = 256
+
+    def __init__(self, store: "SQLiteStore", ttl: float, capacity: int) -> None:
+        super().__init__(ttl, capacity)
+        self.store = store
+        self._claims = itertools.count()
+        conn = store._conn()
+        with conn:
+            for stmt in self.SCHEMA:
+                conn.execute(stmt)
+
+    def claim(self, key: str, fingerprint: bytes) -> Tuple[str, Optional[bytes]]:
+        now = time.time()
+        conn = self.store._conn()
+        with conn:
+            conn.execute(self.EXPIRE, (now,))
+            if next(self._claims) % self.PRUNE_EVERY == 0:
+                conn.execute(self.PRUNE, (self.capacity,))
+            if conn.execute(self.CLAIM, (key, fingerprint, now + self.ttl)).rowcount:
+                return "new", None
+            stored, body = conn.execute(self.LOOKUP, (key,)).fetchone()
+        if stored != fingerprint:
+            return "mismatch", None
+        return ("busy", None) if body is None else ("replay", body)
+
+    def complete(self, key: str, body: bytes) -> None:
+        conn = self.store._conn()
+        with conn:
+            conn.execute(self.COMPLETE, (body, key))
+
+    def release(self, key: str) -> None:
+        conn = self.store._conn()
+        with conn:
+            conn.execute(self.RELEASE, (key,))
+
+class AdmissionControl:
+    """Sheds load early instead of letting request queues grow.
+
+    Each client has a token bucket refilled at ``rate`` per second up to
+    ``burst``, and at most ``max_in_flight`` requests are handled at once
+    per process (a non-blocking semaphore). ``admit`` never waits: a request
+    over either limit is answered 503 straight away with a Retry-After. A
+    zero rate or limit disables that check. Buckets live in one
+    insertion-ordered dict, re-inserted on use, so the least recently seen
+    client is dropped once there are ``max_clients``; an idle client's bucket
+    would have refilled anyway.
+    """
+
+    BUSY_BODY = _dumps({"error": "server is busy, retry later"})
+
+    def __init__(self, max_in_flight: int, rate: float, burst: int, client_header: str = "",
+                 max_clients: int = ADMISSION_CLIENTS) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self.client_header = "HTTP_" + client_header.upper().replace("-", "_") if client_header else ""
+        self.enabled = max_in_flight > 0 or rate > 0
+        self.shed = 0
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # client -> (tokens, refilled at)
+        self._lock = threading.Lock()
+
+    def client(self, environ: Dict) -> str:
+        value = environ.get(self.client_header) if self.client_header else None
+        return value.split(",", 1)[0].strip() if value else environ.get("REMOTE_ADDR", "")
+
+    def admit(self, client: str) -> Optional[int]:
+        """Let a request from ``client`` in (then ``release`` it) and return None, or the seconds to wait."""
+        retry_after = None
+        if self.rate > 0:
+            now = time.monotonic()
+            with self._lock:
+                tokens, refilled = self._buckets.pop(client, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - refilled) * self.rate)
+                self._buckets[client] = (tokens - 1 if tokens >= 1 else tokens, now)
+                if len(self._buckets) > self.max_clients:
+                    del self._buckets[next(iter(self._buckets))]
+            if tokens < 1:
+                retry_after = math.ceil((1 - tokens) / self.rate)
+        if retry_after is None and self._slots is not None and not self._slots.acquire(blocking=False):
+            retry_after = 1
+        if retry_after is not None:
+            with self._lock:
+                self.shed += 1
+        return retry_after
+
+    def release(self) -> None:
+        if self._slots is not None:
+            self._slots.release()
+
+def _open_store(config: Dict[str, Any]) -> WorkoutBackend:
+    """Open the workout store ``config["ACEEST_STORE"]`` names: in-memory (optionally durable) or SQLite."""
+    backend, data_dir = config["ACEEST_STORE"], config["ACEEST_DATA_DIR"]
+    if backend == "sqlite":
+        db_path = config["ACEEST_DB_PATH"] or os.path.join(data_dir or ".", "workouts.db")
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        return SQLiteStore(db_path)
+    if backend != "memory":
+        raise ValueError(f"unknown ACEEST_STORE backend: {backend!r}")
+    if config["WEB_CONCURRENCY"] > 1:
+        raise ValueError("the memory store is per-process; use ACEEST_STORE=sqlite with WEB_CONCURRENCY > 1")
+    store = WorkoutStore()
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+        log = SegmentLog(os.path.join(data_dir, "workouts.seg"), config["ACEEST_FSYNC"], config["ACEEST_FSYNC_INTERVAL"])
+        store.load_weights(os.path.join(data_dir, "members.json"))
+        store.load(log.replay())
+        store.log = log
+        atexit.register(log.close)
+    return store
+
+# create_app() settings; keys are the environment variables they default from
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "WEB_CONCURRENCY": WORKERS,
+    "ACEEST_STORE": STORE_BACKEND,
+    "ACEEST_DATA_DIR": DATA_DIR,
+    "ACEEST_DB_PATH": DB_PATH,
+    "ACEEST_FSYNC": FSYNC_POLICY,
+    "ACEEST_FSYNC_INTERVAL": FSYNC_INTERVAL,
+    "ACEEST_METRICS_DIR": METRICS_DIR,
+    "ACEEST_BMI_CACHE_SIZE": BMI_CACHE_SIZE,
+    "ACEEST_IDEMPOTENCY_TTL": IDEMPOTENCY_TTL,
+    "ACEEST_IDEMPOTENCY_KEYS": IDEMPOTENCY_KEYS,
+    "ACEEST_MAX_IN_FLIGHT": MAX_IN_FLIGHT,
+    "ACEEST_CLIENT_RATE": CLIENT_RATE,
+    "ACEEST_CLIENT_BURST": CLIENT_BURST,
+    "ACEEST_CLIENT_HEADER": CLIENT_HEADER,
+    "ACEEST_STATS_STREAM_RATE": STATS_STREAM_RATE,
+    "ACEEST_STATS_STREAMS": STATS_STREAMS,
+    "ACEEST_REPORT_DIR": REPORT_DIR,
+    "ACEEST_REPORT_WORKERS": REPORT_WORKERS,
+    "ACEEST_REPORT_QUEUE": REPORT_QUEUE,
+}
+
+class AppState:
+    """What one app instance owns: its store, metrics, stats broadcaster, report service and caches."""
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        self.config = config
+        self.workouts = _open_store(config)
+        metrics_dir = config["ACEEST_METRICS_DIR"]
+        self.metrics = MultiprocessMetrics(metrics_dir) if metrics_dir else RequestMetrics()
+        self.broadcaster = StatsBroadcaster(self.workouts, config["ACEEST_STATS_STREAM_RATE"])
+        self.stream_slots = threading.BoundedSemaphore(config["ACEEST_STATS_STREAMS"])
+        self.render_pool = RenderPool(config["ACEEST_REPORT_WORKERS"])
+        self.reports = ReportService(config["ACEEST_REPORT_DIR"], self.render_pool, config["ACEEST_REPORT_QUEUE"])
+        self.charts = ChartCache(self.render_pool)
+        ttl, keys = config["ACEEST_IDEMPOTENCY_TTL"], config["ACEEST_IDEMPOTENCY_KEYS"]
+        if isinstance(self.workouts, SQLiteStore):
+            self.idempotency: IdempotencyCache = SQLiteIdempotency(self.workouts, ttl, keys)
+        else:
+            self.idempotency = IdempotencyCache(ttl, keys)
+        self.admission = AdmissionControl(config["ACEEST_MAX_IN_FLIGHT"], config["ACEEST_CLIENT_RATE"],
+                                          config["ACEEST_CLIENT_BURST"], config["ACEEST_CLIENT_HEADER"])
+        self.bmi_response = functools.lru_cache(maxsize=config["ACEEST_BMI_CACHE_SIZE"])(_bmi_response)
+        self.version_body = _dumps({
+            "app": APP_NAME,
+            "version": VERSION,
+            "python": sys.version.split()[0],
+            "store": config["ACEEST_STORE"],
+            "json": JSON_CODEC,
+        }, sort_keys=True)
+
+def _state() -> AppState:
+    return current_app.extensions["aceest"]
+
+api = Blueprint("aceest", __name__)
+
+def _validate_workout(data: Any) -> Tuple[Optional[Entry], Optional[str]]:
+    """Return ``((type, minutes, timestamp, member_id), None)`` for a valid payload, else ``(None, error)``.
+
+    ``timestamp`` is optional (ISO 8601 or epoch seconds); without one it is
+    None and the store stamps the entry when it is written. ``member_id`` is
+    optional.
+    """
+    if not isinstance(data, dict):
+        return None, "workout must be a JSON object"
+    kind = data.get("type")
+    minutes = data.get("minutes")
+    if not isinstance(kind, str) or not kind.strip():
+        return None, "type is required"
+    if len(kind.strip()) > MAX_TYPE_LENGTH:
+        return None, f"type must be at most {MAX_TYPE_LENGTH} characters"
+    try:
+        minutes = int(minutes)
+    except Exception:
+        return None, "minutes must be an integer"
+    if minutes <= 0:
+        return None, "minutes must be > 0"
+    if minutes > MAX_MINUTES:
+        return None, f"minutes must be <= {MAX_MINUTES}"
+    ts = None
+    if data.get("timestamp") is not None:
+        try:
+            ts = _parse_ts(data["timestamp"])
+        except ValueError:
+            return None, "timestamp must be ISO 8601 or epoch seconds"
+    member = ""
+    if data.get("member_id") is not None:
+        try:
+            member = _parse_member_id(data["member_id"])
+        except ValueError as exc:
+            return None, str(exc)
+    return (kind.strip(), minutes, ts, member), None
+
+def _parse_member_id(value: Any) -> str:
+    """A member id from a string or integer (``regn_id``); raises ValueError otherwise."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not value.strip() or len(value) > MAX_MEMBER_ID_LENGTH:
+        raise ValueError(f"member_id must be a non-empty string of at most {MAX_MEMBER_ID_LENGTH} characters")
+    return value.strip()
+
+def _time_window() -> Tuple[Optional[float], Optional[float]]:
+    """Parse the ``since``/``until`` query params; raises ``ValueError``."""
+    since, until = request.args.get("since"), request.args.get("until")
+    return (None if since is None else _parse_ts(since), None if until is None else _parse_ts(until))
+
+@api.before_app_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+@api.before_app_request
+def _admit():
+    admission = _state().admission
+    if not admission.enabled or request.path in ADMISSION_EXEMPT or request.environ.get("aceest.admitted"):
+        return None  # the ASGI adapter admits before queueing the request for a thread
+    retry_after = admission.admit(admission.client(request.environ))
+    if retry_after is not None:
+        _state().metrics.set_counter("aceest_requests_shed_total", admission.shed)
+        return Response(admission.BUSY_BODY, 503, mimetype="application/json", headers={"Retry-After": str(retry_after)})
+    g.admitted = True
+    return None
+
+@api.teardown_app_request
+def _release(exc):
+    if g.pop("admitted", False):
+        _state().admission.release()
+
+@api.after_app_request
+def _record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # label by route template, not raw path, to keep series cardinality bounded
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        _state().metrics.observe(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+# constant bodies, encoded once at import (/version's once per app)
+HOME_BODY = _dumps({"app": APP_NAME, "version": VERSION}, sort_keys=True)
+HEALTH_BODY = b"OK"
+
+@api.get("/")
 def home():
-    return jsonify({"app": APP_NAME, "version": VERSION}), 200
+    return Response(HOME_BODY, 200, mimetype="application/json")
+
+@api.get("/version")
+def version():
+    """App and runtime versions plus the configured store and JSON codec."""
+    return Response(_state().version_body, 200, mimetype="application/json")
 
-@app.get("/health")
+@api.get("/health")
 def health():
-    return "OK", 200
+    return HEALTH_BODY, 200
 
-@app.get("/bmi")
+def _bmi_response(h: float, w: float) -> Tuple[bytes, str]:
+    """Encoded ``/bmi`` body and its ETag; each app memoizes it in an LRU cache."""
+    m = h / 100.0
+    bmi_val = round(w / (m * m), 2)
+    body = _dumps({"bmi": bmi_val, "height_cm": h, "weight_kg": w})
+    etag = hashlib.sha1(VERSION.encode() + b":" + body).hexdigest()[:20]
+    return body, etag
+
+@api.get("/bmi")
 def bmi():
     """Compute BMI given height_cm and weight_kg as query params."""
     try:
@@ -28,52 +2132,798 @@ def bmi():
         return jsonify({"error": "height_cm and weight_kg must be numbers"}), 400
     if h <= 0 or w <= 0:
         return jsonify({"error": "height_cm and weight_kg must be > 0"}), 400
-    m = h / 100.0
-    bmi_val = round(w / (m * m), 2)
-    return jsonify({"bmi": bmi_val, "height_cm": h, "weight_kg": w}), 200
+    state = _state()
+    body, etag = state.bmi_response(h, w)
+    info = state.bmi_response.cache_info()
+    state.metrics.set_counter("aceest_bmi_cache_hits_total", info.hits)
+    state.metrics.set_counter("aceest_bmi_cache_misses_total", info.misses)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": f"public, max-age={BMI_MAX_AGE}"}
+    if request.if_none_match.contains_weak(etag):  # If-None-Match compares weakly (RFC 9110)
+        return Response(status=304, headers=headers)
+    return Response(body, 200, headers=headers, mimetype="application/json")
+
+def _bmi_columns(heights: List[Any], weights: List[Any]) -> Tuple[List[Optional[float]], List[Dict]]:
+    """Compute BMI for parallel columns, returning values (None when invalid) and row errors."""
+    np = _numpy()
+    if np is not None:
+        try:
+            h = np.asarray(heights, dtype=np.float64)
+            w = np.asarray(weights, dtype=np.float64)
+        except (TypeError, ValueError, OverflowError):
+            h = w = None
+        if h is None or h.ndim != 1 or w.ndim != 1:
+            # mixed rows, or nested lists that asarray would turn into extra dimensions
+            h = np.array([_to_float(v) for v in heights], dtype=np.float64)
+            w = np.array([_to_float(v) for v in weights], dtype=np.float64)
+        numeric = np.isfinite(h) & np.isfinite(w)
+        ok = numeric & (h > 0) & (w > 0)
+        m = np.where(ok, h, 100.0) / 100.0
+        values = np.round(w / (m * m), 2)
+        out: List[Optional[float]] = np.where(ok, values, np.nan).tolist()
+        bad = np.flatnonzero(~ok).tolist()
+        errors = [
+            {"index": i, "error": "height_cm and weight_kg must be > 0" if numeric[i] else "height_cm and weight_kg must be numbers"}
+            for i in bad
+        ]
+        for i in bad:
+            out[i] = None
+        return out, errors
+
+    out = []
+    errors = []
+    for i, (h, w) in enumerate(zip(map(_to_float, heights), map(_to_float, weights))):
+        if not (math.isfinite(h) and math.isfinite(w)):
+            errors.append({"index": i, "error": "height_cm and weight_kg must be numbers"})
+            out.append(None)
+        elif h <= 0 or w <= 0:
+            errors.append({"index": i, "error": "height_cm and weight_kg must be > 0"})
+            out.append(None)
+        else:
+            m = h / 100.0
+            out.append(round(w / (m * m), 2))
+    return out, errors
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError, OverflowError):
+        return float("nan")
+
+@api.post("/bmi/batch")
+def bmi_batch():
+    """Compute BMI for many rows in one vectorized pass.
 
-@app.get("/workouts")
+    Accepts columns (``{"height_cm": [...], "weight_kg": [...]}``) or NDJSON
+    rows with the same keys. Rows failing the ``/bmi`` validation come back
+    as null in ``bmi`` and are listed in ``invalid``.
+    """
+    if request.mimetype == "application/x-ndjson":
+        heights: List[Any] = []
+        weights: List[Any] = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                row = _loads(line)
+            except ValueError:
+                row = None
+            if not isinstance(row, dict):
+                row = {}
+            heights.append(row.get("height_cm"))
+            weights.append(row.get("weight_kg"))
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "body must be a JSON object of columns or NDJSON"}), 400
+        heights, weights = data.get("height_cm"), data.get("weight_kg")
+        if not isinstance(heights, list) or not isinstance(weights, list) or len(heights) != len(weights):
+            return jsonify({"error": "height_cm and weight_kg must be arrays of equal length"}), 400
+    if len(heights) > MAX_BMI_ROWS:
+        return jsonify({"error": f"batch exceeds {MAX_BMI_ROWS} rows"}), 413
+
+    values, invalid = _bmi_columns(heights, weights)
+    return jsonify({"count": len(values), "bmi": values, "invalid": invalid}), 200
+
+@api.get("/workouts")
 def get_workouts():
-    return jsonify({"count": len(workouts), "items": workouts}), 200
+    """List workouts a page at a time.
+
+    ``cursor`` is the sequence number (position in the append-only store) to
+    start from and ``limit`` caps the page size; the response carries the
+    ``next_cursor`` to continue from, or null once the end is reached.
+    With ``since``/``until`` only entries timestamped in that window are
+    listed, in time order, and ``cursor`` is an offset into the window.
+    With ``format=ndjson`` the items are streamed one JSON object per line.
+    """
+    workouts = _state().workouts
+    try:
+        cursor = int(request.args.get("cursor", 0))
+        limit = request.args.get("limit")
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({"error": "cursor and limit must be integers"}), 400
+    if cursor < 0 or (limit is not None and limit <= 0):
+        return jsonify({"error": "cursor must be >= 0 and limit > 0"}), 400
+    if cursor > MAX_CURSOR or (limit is not None and limit > MAX_CURSOR):
+        return jsonify({"error": f"cursor and limit must be at most {MAX_CURSOR}"}), 400
+    try:
+        since, until = _time_window()
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO 8601 or epoch seconds"}), 400
+
+    if since is not None or until is not None:
+        end = workouts.count_between(since, until)
+        if request.args.get("format") == "ndjson":
+            items = workouts.iter_between(since, until, cursor, limit)
+            return Response((_dumps(item) + b"\n" for item in items), 200, mimetype="application/x-ndjson")
+        page = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        items = list(workouts.iter_between(since, until, cursor, page))
+        next_cursor = cursor + len(items) if cursor + len(items) < end else None
+        return jsonify({"count": end, "items": items, "next_cursor": next_cursor}), 200
+
+    # entries are only ever appended, so the length read here pins a stable view
+    end = len(workouts)
+    if request.args.get("format") == "ndjson":
+        stop = end if limit is None else min(end, cursor + limit)
+
+        def generate():
+            for item in workouts.iter_range(cursor, stop):
+                yield _dumps(item) + b"\n"
+
+        return Response(generate(), 200, mimetype="application/x-ndjson")
 
-@app.post("/workouts")
+    stop = min(end, cursor + min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    next_cursor = stop if stop < end else None
+    return jsonify({"count": end, "items": workouts.slice(cursor, stop), "next_cursor": next_cursor}), 200
+
+@api.post("/workouts")
 def add_workout():
-    data = request.get_json(silent=True) or {}
-    kind = data.get("type")
-    minutes = data.get("minutes")
+    """Store one workout.
 
-    # Basic validation
-    if not isinstance(kind, str) or not kind.strip():
-        return jsonify({"error": "type is required"}), 400
+    With an ``Idempotency-Key`` header a retried request (same key, same
+    body) gets the original 201 response back instead of adding a duplicate.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if key is None:
+        return _add_workout()
+    if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return jsonify({"error": f"Idempotency-Key must be 1 to {MAX_IDEMPOTENCY_KEY_LENGTH} characters"}), 400
+    cache = _state().idempotency
+    outcome, body = cache.claim(key, hashlib.sha1(request.get_data()).digest())
+    if outcome == "replay":
+        return Response(body, 201, mimetype="application/json", headers={"Idempotent-Replayed": "true"})
+    if outcome == "busy":
+        return jsonify({"error": "a request with this Idempotency-Key is in progress"}), 409, {"Retry-After": "1"}
+    if outcome == "mismatch":
+        return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+    completed = False
     try:
-        minutes = int(minutes)
-    except Exception:
-        return jsonify({"error": "minutes must be an integer"}), 400
-    if minutes <= 0:
-        return jsonify({"error": "minutes must be > 0"}), 400
+        response, status = _add_workout()
+        if status == 201:
+            cache.complete(key, response.get_data())
+            completed = True
+        return response, status
+    finally:
+        if not completed:
+            cache.release(key)  # a rejected or failed request may be retried with the same key
+
+def _add_workout():
+    workouts = _state().workouts
+    data = request.get_json(silent=True) or {}
+    valid, error = _validate_workout(data)
+    if error:
+        return jsonify({"error": error}), 400
+    seq = workouts.append(*valid)
+    return jsonify({"ok": True, "added": workouts.slice(seq, seq + 1)[0]}), 201
 
-    workouts.append({"type": kind.strip(), "minutes": minutes})
-    return jsonify({"ok": True, "added": {"type": kind, "minutes": minutes}}), 201
+@api.post("/workouts/batch")
+def add_workouts_batch():
+    """Ingest many workouts from a JSON array or an NDJSON body.
 
-@app.get("/stats")
+    Each item is validated like ``POST /workouts``; the valid ones are appended
+    under a single lock acquisition and the response reports per-item results.
+    """
+    if request.mimetype == "application/x-ndjson":
+        items: List[Any] = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(_loads(line))
+            except ValueError:
+                items.append(None)
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({"error": "body must be a JSON array or NDJSON"}), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({"error": f"batch exceeds {MAX_BATCH_ITEMS} items"}), 413
+
+    results = []
+    accepted = []
+    for i, item in enumerate(items):
+        valid, error = _validate_workout(item)
+        if error:
+            results.append({"index": i, "ok": False, "error": error})
+        else:
+            results.append({"index": i, "ok": True})
+            accepted.append(valid)
+    if accepted:
+        _state().workouts.extend(accepted)
+
+    status = 201 if accepted else 400
+    return jsonify({"added": len(accepted), "rejected": len(items) - len(accepted), "results": results}), status
+
+@api.get("/stats")
 def stats():
-    total = sum(w.get("minutes", 0) for w in workouts)
-    by_type = {}
-    for w in workouts:
-        by_type[w["type"]] = by_type.get(w["type"], 0) + w["minutes"]
-    return jsonify({"count": len(workouts), "total_minutes": total, "by_type": by_type}), 200
+    """Count, total and per-type minutes, optionally for a ``since``/``until`` window."""
+    try:
+        since, until = _time_window()
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO 8601 or epoch seconds"}), 400
+    return jsonify(_state().workouts.aggregate(since, until)), 200
+
+@api.get("/stats/stream")
+def stats_stream():
+    """Server-sent events: a ``snapshot`` of ``/stats``, then ``delta`` events.
+
+    A delta carries the new count and total and only the ``by_type`` totals
+    that changed; events come from the app's shared ``StatsBroadcaster``.
+    A stream served here holds a worker thread, so beyond
+    ``ACEEST_STATS_STREAMS`` open streams the answer is 503.
+    """
+    state = _state()
+    if not state.stream_slots.acquire(blocking=False):
+        return jsonify({"error": "too many open streams, retry later"}), 503, {"Retry-After": str(int(SSE_HEARTBEAT))}
+    broadcaster = state.broadcaster
+    events: "queue.Queue[bytes]" = queue.Queue(SSE_QUEUE_SIZE)
+
+    def deliver(event: bytes) -> bool:
+        try:
+            events.put_nowait(event)
+            return True
+        except queue.Full:
+            return False
+
+    token, snapshot = broadcaster.subscribe(deliver)
+
+    def generate():
+        try:
+            yield snapshot
+            while True:
+                try:
+                    yield events.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    if not broadcaster.subscribed(token):
+                        return
+                    yield b": keepalive\n\n"
+        finally:
+            broadcaster.unsubscribe(token)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    response = Response(generate(), 200, mimetype="text/event-stream", headers=headers)
+    # runs even if the stream never started, unlike the generator's finally
+    response.call_on_close(state.stream_slots.release)
+    return response
+
+EPOCH_DATE = date(1970, 1, 1)
+
+def _period_start(day: date, period: str) -> date:
+    if period == "weekly":
+        return day - timedelta(days=day.weekday())
+    if period == "monthly":
+        return day.replace(day=1)
+    return day
+
+def _next_period(start: date, period: str) -> date:
+    if period == "weekly":
+        return start + timedelta(days=7)
+    if period == "monthly":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+@api.get("/history/<any(daily, weekly, monthly):period>")
+def history(period):
+    """Count, total and per-type minutes per day, week (from Monday) or month, from the daily rollups.
+
+    ``from`` and ``to`` are inclusive ISO dates (UTC), by default the last 30
+    days; weeks and months are widened to whole periods. Every period in the
+    range is listed, empty ones with zeros. The cost grows with the number of
+    days in the range, not with the number of workouts stored.
+    """
+    try:
+        to = date.fromisoformat(request.args["to"]) if "to" in request.args else datetime.now(timezone.utc).date()
+        first = date.fromisoformat(request.args["from"]) if "from" in request.args else to - timedelta(days=29)
+        first, stop = _period_start(first, period), _next_period(_period_start(to, period), period)
+    except (ValueError, OverflowError):
+        return jsonify({"error": "from and to must be ISO 8601 dates (YYYY-MM-DD)"}), 400
+    if first >= stop:
+        return jsonify({"error": "from must not be after to"}), 400
+    if (stop - first).days > MAX_HISTORY_DAYS:
+        return jsonify({"error": f"history spans at most {MAX_HISTORY_DAYS} days"}), 400
+
+    days = _state().workouts.daily((first - EPOCH_DATE).days, (stop - EPOCH_DATE).days)
+    items = []
+    start = first
+    while start < stop:
+        end = _next_period(start, period)
+        item = {"date": start.isoformat(), "count": 0, "total_minutes": 0, "by_type": {}}
+        for day in range((start - EPOCH_DATE).days, (end - EPOCH_DATE).days):
+            bucket = days.get(day)
+            if bucket is not None:
+                item["count"] += bucket["count"]
+                item["total_minutes"] += bucket["total_minutes"]
+                for kind, minutes in bucket["by_type"].items():
+                    item["by_type"][kind] = item["by_type"].get(kind, 0) + minutes
+        items.append(item)
+        start = end
+    to = stop - timedelta(days=1)
+    return jsonify({"period": period, "from": first.isoformat(), "to": to.isoformat(), "items": items}), 200
+
+@api.get("/members/<member_id>/stats")
+def member_stats(member_id):
+    """Per-member count, total and per-type minutes, from that member's aggregates."""
+    agg = _state().workouts.member_stats(member_id)
+    if agg is None:
+        return jsonify({"error": "unknown member"}), 404
+    return jsonify({"member_id": member_id, **agg}), 200
+
+@api.get("/members/<member_id>/workouts")
+def member_workouts(member_id):
+    """A member's workout history, paged with ``cursor`` (offset) and ``limit``."""
+    workouts = _state().workouts
+    try:
+        cursor = int(request.args.get("cursor", 0))
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "cursor and limit must be integers"}), 400
+    if cursor < 0 or limit <= 0:
+        return jsonify({"error": "cursor must be >= 0 and limit > 0"}), 400
+    if cursor > MAX_CURSOR or limit > MAX_CURSOR:
+        return jsonify({"error": f"cursor and limit must be at most {MAX_CURSOR}"}), 400
+    agg = workouts.member_stats(member_id)
+    if agg is None:
+        return jsonify({"error": "unknown member"}), 404
+    items = list(workouts.iter_member(member_id, cursor, min(limit, MAX_PAGE_SIZE)))
+    next_cursor = cursor + len(items) if cursor + len(items) < agg["count"] else None
+    return jsonify({"member_id": member_id, "count": agg["count"], "items": items, "next_cursor": next_cursor}), 200
+
+@api.get("/calories")
+def calories():
+    """Calorie totals per workout type, for everyone or for ``member_id``."""
+    workouts = _state().workouts
+    member = request.args.get("member_id")
+    if member is not None:
+        try:
+            member = _parse_member_id(member)
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+    data = workouts.calories(member)
+    if data is None:
+        return jsonify({"error": "unknown member"}), 404
+    if member is not None:
+        data = {"member_id": member, "weight_kg": workouts.weight(member) or DEFAULT_WEIGHT_KG, **data}
+    return jsonify(data), 200
+
+@api.post("/calories")
+def set_member_weight():
+    """Record ``{"member_id", "weight_kg"}`` and recompute that member's calories."""
+    workouts = _state().workouts
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "body must be a JSON object"}), 400
+    try:
+        member = _parse_member_id(data.get("member_id"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    weight = data.get("weight_kg")
+    if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not 0 < weight <= MAX_WEIGHT_KG:
+        return jsonify({"error": f"weight_kg must be a number > 0 and <= {MAX_WEIGHT_KG:g}"}), 400
+    workouts.set_weight(member, float(weight))
+    return jsonify({"member_id": member, "weight_kg": float(weight), **workouts.calories(member)}), 200
+
+@api.post("/reports")
+def submit_report():
+    """Queue the weekly PDF for ``{"member_id", "week"}`` and return its job id right away.
+
+    ``week`` is any ISO date in the Monday-to-Sunday (UTC) week, the current
+    one by default. The PDF renders on the report process pool; poll ``url``
+    for it. Unchanged data maps to the same id and is not rendered again.
+    """
+    state = _state()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "body must be a JSON object"}), 400
+    try:
+        member = _parse_member_id(data.get("member_id"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    week = data.get("week")
+    try:
+        day = datetime.now(timezone.utc).date() if week is None else date.fromisoformat(week)
+    except (TypeError, ValueError):
+        return jsonify({"error": "week must be an ISO 8601 date (YYYY-MM-DD)"}), 400
+    report = _weekly_report(state.workouts, member, day)
+    if report is None:
+        return jsonify({"error": "unknown member"}), 404
+    job_id, status = state.reports.submit(report)
+    if status == "busy":
+        return jsonify({"error": "too many reports rendering, retry later"}), 503, {"Retry-After": "1"}
+    url = f"/reports/{job_id}"
+    body = {"job_id": job_id, "status": status, "url": url}
+    return jsonify(body), 200 if status == "done" else 202, {"Location": url}
+
+@api.get("/reports/<job_id>")
+def get_report(job_id):
+    """Stream a finished report PDF; 202 while it renders, 500 if rendering failed."""
+    if not REPORT_ID.fullmatch(job_id):
+        return jsonify({"error": "unknown report"}), 404
+    status, detail = _state().reports.status(job_id)
+    if status == "pending":
+        return jsonify({"job_id": job_id, "status": status}), 202, {"Retry-After": "1"}
+    if status == "failed":
+        return jsonify({"job_id": job_id, "status": status, "error": detail}), 500
+    if status == "done":
+        try:
+            # the id is a hash of the report's content, so it makes a stable ETag
+            return send_file(detail, mimetype="application/pdf", download_name=f"weekly-report-{job_id}.pdf",
+                             etag=job_id)
+        except FileNotFoundError:
+            pass  # pruned since the status check
+    return jsonify({"error": "unknown report"}), 404
+
+@api.get("/charts/progress.<any(png, svg):fmt>")
+def progress_chart(fmt):
+    """The desktop tracker's progress charts, for everyone or ``member_id``, as PNG or SVG.
+
+    Drawn on the render pool once per store version; 202 while it renders, 503
+    when too many charts are rendering. Clients revalidate with the ETag.
+    """
+    state = _state()
+    member = request.args.get("member_id")
+    agg = state.workouts.aggregate() if member is None else state.workouts.member_stats(member)
+    if agg is None:
+        return jsonify({"error": "unknown member"}), 404
+    future = state.charts.get(member, fmt, agg["count"], agg["by_type"])
+    if future is None:
+        return jsonify({"error": "too many charts rendering, retry later"}), 503, {"Retry-After": "1"}
+    if not future.done():
+        return jsonify({"status": "pending"}), 202, {"Retry-After": "1"}
+    error = future.exception()
+    if error is not None:
+        return jsonify({"status": "failed", "error": f"{type(error).__name__}: {error}"}), 500
+    body = future.result()
+    etag = hashlib.sha1(body).hexdigest()[:20]
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+    return Response(body, 200, headers=headers, mimetype="image/png" if fmt == "png" else "image/svg+xml")
 
-@app.get("/summary")
+@api.get("/summary")
 def summary():
-    total = sum(w.get("minutes", 0) for w in workouts)
-    return jsonify({"summary": f"Workouts: {len(workouts)} | Total minutes: {total} | Version: {VERSION}"}), 200
+    count, total = _state().workouts.totals()
+    return jsonify({"summary": f"Workouts: {count} | Total minutes: {total} | Version: {VERSION}"}), 200
 
-@app.get("/metrics")
+COUNTER_HELP = {
+    "aceest_bmi_cache_hits_total": "/bmi responses served from the LRU cache.",
+    "aceest_bmi_cache_misses_total": "/bmi responses computed.",
+    "aceest_requests_shed_total": "Requests answered 503 by admission control.",
+}
+
+@api.get("/metrics")
 def metrics():
-    # very minimal demo metrics (NOT Prometheus format)
-    total = sum(w.get("minutes", 0) for w in workouts)
-    return f"aceest_workouts_total {len(workouts)}\naceest_minutes_total {total}\n", 200, {"Content-Type": "text/plain; charset=utf-8"}
+    """Prometheus text exposition of request and store metrics."""
+    state = _state()
+    count, total = state.workouts.totals()
+    series, counters = state.metrics.snapshot()
+    lines = [
+        "# HELP aceest_workouts_total Workouts stored.",
+        "# TYPE aceest_workouts_total counter",
+        f"aceest_workouts_total {count}",
+        "# HELP aceest_minutes_total Workout minutes stored.",
+        "# TYPE aceest_minutes_total counter",
+        f"aceest_minutes_total {total}",
+    ]
+    for name, help_text in COUNTER_HELP.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {int(counters.get(name, 0))}"]
+    body = "\n".join(lines) + "\n" + _render_http_metrics(series, state.metrics.BUCKETS)
+    return body, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    """Build an app instance that owns its store, metrics, broadcaster and caches.
+
+    ``config`` overrides ``DEFAULT_CONFIG`` (read from the environment at
+    import). Instances share nothing, so tests and embedders can make as
+    many as they need without re-importing the module.
+    """
+    settings = {**DEFAULT_CONFIG, **(config or {})}
+    workers = settings["WEB_CONCURRENCY"] = int(settings["WEB_CONCURRENCY"])
+    # several workers must share one store, so they default to sqlite
+    settings["ACEEST_STORE"] = settings["ACEEST_STORE"] or ("sqlite" if workers > 1 else "memory")
+    if workers > 1 and not settings["ACEEST_METRICS_DIR"]:
+        # workers would otherwise each report only their own counts
+        settings["ACEEST_METRICS_DIR"] = tempfile.mkdtemp(prefix="aceest-metrics-")
+    if workers > 1 and not settings["ACEEST_REPORT_DIR"]:
+        # a report may be polled from any worker, so they all keep reports in one place
+        settings["ACEEST_REPORT_DIR"] = tempfile.mkdtemp(prefix="aceest-reports-")
+    instance = Flask(__name__)
+    instance.json = FastJSONProvider(instance)
+    instance.config.update(settings)
+    instance.extensions["aceest"] = AppState(instance.config)
+    instance.register_blueprint(api)
+    return instance
+
+def _wsgi_environ(scope: Dict, body: bytes, multiprocess: bool = False) -> Dict:
+    """Build a PEP 3333 environ for an ASGI HTTP ``scope`` and its full body."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": multiprocess,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", ()):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        environ[key] = environ[key] + "," + value if key in environ else value
+    # the body has been read in full (and de-chunked by the server)
+    environ["CONTENT_LENGTH"] = str(len(body))
+    environ.pop("HTTP_TRANSFER_ENCODING", None)
+    return environ
+
+class AsyncApp:
+    """ASGI entry point serving the Flask routes from an event loop.
+
+    Connections are owned by the event loop, so a slow client (waiting on its
+    request body or reading the response) costs a coroutine, not a thread.
+    Once the body is in, a GET that the memory store answers from its
+    published snapshot runs inline, without locking. Anything that can block
+    runs on a bounded thread pool instead: every request to the SQLite store,
+    every non-GET request (they write or take the store's writer lock), GET
+    routes under ``ASGI_BLOCKING_PREFIXES``, queries with a ``since``/``until``
+    window and bodies over ``ASGI_INLINE_BODY``.
+    """
+
+    def __init__(self, wsgi_app: Flask, max_threads: int = THREADS) -> None:
+        self.wsgi_app = wsgi_app
+        self.state: AppState = wsgi_app.extensions["aceest"]
+        config = self.state.config
+        self.offload_all = not isinstance(self.state.workouts, WorkoutStore)
+        self.multiprocess = config["WEB_CONCURRENCY"] > 1
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="aceest-asgi")
+
+    def _offload(self, method: str, path: str, body: bytes, query: bytes = b"") -> bool:
+        if self.offload_all or method != "GET" or len(body) > ASGI_INLINE_BODY:
+            return True
+        if path.startswith(ASGI_BLOCKING_PREFIXES):
+            return True
+        return any(pair.split(b"=", 1)[0] in ASGI_BLOCKING_PARAMS for pair in query.split(b"&"))
+
+    def _call(self, environ: Dict) -> Tuple[str, List[Tuple[str, str]], Iterable[bytes]]:
+        started: List[Any] = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        body = self.wsgi_app(environ, start_response)
+        return started[0], started[1], body
+
+    @staticmethod
+    def _next_chunks(chunks: Iterator[bytes]) -> List[bytes]:
+        out = []
+        for chunk in chunks:
+            out.append(chunk)
+            if len(out) == ASGI_CHUNKS_PER_SEND:
+                break
+        return out
+
+    async def __call__(self, scope: Dict, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    self._executor.shutdown(wait=False)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        if scope["method"] == "GET" and scope["path"] == "/stats/stream":
+            # a WSGI stream would hold a thread per subscriber; serve it on the loop
+            await self._stream_stats(receive, send)
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        body = bytes(body)
+
+        environ = _wsgi_environ(scope, body, self.multiprocess)
+        admission = self.state.admission
+        if admission.enabled and scope["path"] not in ADMISSION_EXEMPT:
+            # admit before the request can queue for a thread; the Flask hook then skips it
+            retry_after = admission.admit(admission.client(environ))
+            if retry_after is not None:
+                self.state.metrics.set_counter("aceest_requests_shed_total", admission.shed)
+                await send({"type": "http.response.start", "status": 503, "headers": [
+                    (b"content-type", b"application/json"), (b"retry-after", str(retry_after).encode())]})
+                await send({"type": "http.response.body", "body": admission.BUSY_BODY})
+                return
+            environ["aceest.admitted"] = True
+        try:
+            await self._respond(scope, environ, body, send)
+        finally:
+            if environ.get("aceest.admitted"):
+                admission.release()
+
+    async def _respond(self, scope: Dict, environ: Dict, body: bytes, send) -> None:
+        loop = asyncio.get_running_loop()
+        offload = self._offload(scope["method"], scope["path"], body, scope.get("query_string", b""))
+        if offload:
+            status, headers, result = await loop.run_in_executor(self._executor, self._call, environ)
+        else:
+            status, headers, result = self._call(environ)
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        })
+        chunks = iter(result)
+        try:
+            while True:
+                if offload:
+                    batch = await loop.run_in_executor(self._executor, self._next_chunks, chunks)
+                else:
+                    batch = self._next_chunks(chunks)
+                if not batch:
+                    break
+                await send({"type": "http.response.body", "body": b"".join(batch), "more_body": True})
+                # let other connections run between batches of a long stream
+                await asyncio.sleep(0)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _stream_stats(self, receive, send) -> None:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        events: "asyncio.Queue[bytes]" = asyncio.Queue()
+
+        def deliver(event: bytes) -> bool:
+            # called from the broadcaster thread
+            if events.qsize() >= SSE_QUEUE_SIZE:
+                return False
+            loop.call_soon_threadsafe(events.put_nowait, event)
+            return True
+
+        broadcaster = self.state.broadcaster
+        token, snapshot = broadcaster.subscribe(deliver)
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no")],
+            })
+            self.state.metrics.observe("/stats/stream", "GET", 200, time.perf_counter() - started)
+            await send({"type": "http.response.body", "body": snapshot, "more_body": True})
+            while not disconnected.done():
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, disconnected}, timeout=SSE_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    body = getter.result()
+                else:
+                    getter.cancel()
+                    if disconnected.done() or not broadcaster.subscribed(token):
+                        break
+                    body = b": keepalive\n\n"
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+        finally:
+            broadcaster.unsubscribe(token)
+            disconnected.cancel()
+
+    @staticmethod
+    async def _wait_disconnect(receive) -> None:
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+# the environment-configured instance behind ``python <this file>``, serve() and
+# module attributes such as ``app`` and ``workouts``; built on first use so that
+# importing the module stays cheap
+_default: Dict[str, Any] = {}
+_default_lock = threading.Lock()
+
+def _default_app() -> Flask:
+    with _default_lock:
+        if not _default:
+            instance = create_app()
+            state = instance.extensions["aceest"]
+            _default.update(
+                app=instance,
+                asgi_app=AsyncApp(instance),  # ACEEST_SERVER=async serves this through uvicorn workers
+                workouts=state.workouts,
+                request_metrics=state.metrics,
+                stats_broadcaster=state.broadcaster,
+            )
+        return _default["app"]
+
+def __getattr__(name: str) -> Any:
+    if name in ("app", "asgi_app", "workouts", "request_metrics", "stats_broadcaster"):
+        _default_app()
+        return _default[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def serve() -> None:
+    """Run the app under gunicorn's prefork server.
+
+    ``WEB_CONCURRENCY`` worker processes each serve ``ACEEST_THREADS`` threads
+    and share the SQLite store and the ``ACEEST_METRICS_DIR`` metric files. ``kill -HUP`` on the master gracefully
+    replaces the workers; ``SIGTERM`` lets in-flight requests finish within
+    ``ACEEST_GRACEFUL_TIMEOUT`` seconds. With ``ACEEST_SERVER=async`` the
+    workers are uvicorn event loops serving ``asgi_app`` instead of threads.
+
+    The memory store lives in its (single) worker, so the app is not
+    preloaded then: each new worker, after a reload or a respawn, opens the
+    store itself and replays ``workouts.seg`` instead of inheriting the
+    master's state from startup. Writes the old worker still accepts while
+    it drains are in the log but only seen by the next worker after that.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    preload = (STORE_BACKEND or ("sqlite" if WORKERS > 1 else "memory")) != "memory"
+    metrics_dir = _default_app().config["ACEEST_METRICS_DIR"] if preload else METRICS_DIR
+    if metrics_dir:
+        # series from a previous run would otherwise be folded into this one
+        for path in glob.glob(os.path.join(metrics_dir, "metrics_*.db")):
+            os.unlink(path)
+
+    asynchronous = os.environ.get("ACEEST_SERVER") == "async"
+    options = {
+        "bind": f"0.0.0.0:{os.environ.get('PORT', '5000')}",
+        "workers": WORKERS,
+        "threads": THREADS,
+        "worker_class": "uvicorn.workers.UvicornWorker" if asynchronous else "gthread",
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "preload_app": preload,
+        "accesslog": "-",
+    }
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            instance = _default_app()
+            return _default["asgi_app"] if asynchronous else instance
+
+    Server().run()
 
 if __name__ == "__main__":
-    # Bind to 0.0.0.0 for container use
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", "5000")), debug=False)
+    if os.environ.get("ACEEST_SERVER") in ("production", "async"):
+        serve()
+    else:
+        # Bind to 0.0.0.0 for container use
+        _default_app().run(host="0.0.0.0", port=int(os.environ.get("PORT", "5000")), debug=False)
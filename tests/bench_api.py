@@ -0,0 +1,145 @@
+"""Cross-version performance benchmarks for the Flask app versions.
+
+Loads every version through the same ``_load_module`` helper the tests use,
+pre-fills the workout store to each requested size and times the routes the
+version has through Flask's test client (no network in the loop)::
+
+    python tests/bench_api.py --sizes 1000,100000 --output bench_results.json
+    python tests/bench_api.py --baseline bench_baseline.json --threshold 0.2
+
+Results are written as JSON. With ``--baseline`` the run exits non-zero when
+a case's p50 latency or throughput is worse than the baseline by more than
+``--threshold`` (a fraction).
+"""
+import argparse
+import json
+import pathlib
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+from test_api import APP_DIR, VERSION_FILES, _load_module  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+# (name, first version index that has the route, request factory)
+CASES = [
+    ("GET /health", 0, lambda c: c.get("/health")),
+    ("GET /bmi", 1, lambda c: c.get("/bmi?height_cm=180&weight_kg=81")),
+    ("POST /workouts", 2, lambda c: c.post("/workouts", json={"type": "Run", "minutes": 30})),
+    ("GET /workouts", 2, lambda c: c.get("/workouts")),
+    ("GET /stats", 4, lambda c: c.get("/stats")),
+]
+# routes whose cost does not depend on the store size are only run once
+SIZE_INDEPENDENT = {"GET /health", "GET /bmi"}
+TYPES = ["Run", "Bike", "Swim", "Row", "Yoga"]
+
+
+def prefill(mod, size: int) -> None:
+    """Load ``size`` workouts straight into the module's store."""
+    store = mod.workouts
+    pairs = ((TYPES[i % len(TYPES)], 1 + i % 90) for i in range(size))
+    if isinstance(store, list):
+        store.extend({"type": kind, "minutes": minutes} for kind, minutes in pairs)
+    else:
+        now = time.time()
+        store.extend((kind, minutes, now, "") for kind, minutes in pairs)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def time_case(client, request: Callable, iterations: int, max_seconds: float) -> Dict:
+    request(client)  # warm-up
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    for _ in range(iterations):
+        start = time.perf_counter()
+        res = request(client)
+        samples.append(time.perf_counter() - start)
+        if res.status_code >= 400:
+            raise RuntimeError(f"benchmark request failed with {res.status_code}")
+        if time.perf_counter() > deadline and len(samples) >= 5:
+            break
+    samples.sort()
+    return {
+        "samples": len(samples),
+        "rps": round(len(samples) / sum(samples), 1),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 4),
+    }
+
+
+def run(versions: List[str], sizes: List[int], iterations: int, max_seconds: float) -> List[Dict]:
+    results = []
+    for index, fname in enumerate(VERSION_FILES):
+        if fname not in versions:
+            continue
+        for case, since, request in CASES:
+            if index < since:
+                continue
+            for size in [0] if case in SIZE_INDEPENDENT else sizes:
+                mod = _load_module(APP_DIR / fname)
+                if size:
+                    prefill(mod, size)
+                timing = time_case(mod.app.test_client(), request, iterations, max_seconds)
+                results.append({"version": fname, "case": case, "size": size, **timing})
+                print(f"{fname:26} {case:16} {size:>8} {timing['rps']:>10} rps "
+                      f"p50 {timing['p50_ms']:.3f} ms  p99 {timing['p99_ms']:.3f} ms", flush=True)
+    return results
+
+
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> List[str]:
+    """Describe every case that regressed beyond ``threshold`` against ``baseline``."""
+    previous = {(r["version"], r["case"], r["size"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        base = previous.get((r["version"], r["case"], r["size"]))
+        if base is None:
+            continue
+        if r["p50_ms"] > base["p50_ms"] * (1 + threshold):
+            regressions.append(f"{r['version']} {r['case']} size={r['size']}: "
+                               f"p50 {base['p50_ms']} -> {r['p50_ms']} ms")
+        if r["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{r['version']} {r['case']} size={r['size']}: "
+                               f"throughput {base['rps']} -> {r['rps']} rps")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--versions", default=",".join(VERSION_FILES),
+                        help="comma-separated version files to benchmark")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated store sizes")
+    parser.add_argument("--iterations", type=int, default=200, help="max requests per case")
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="time budget per case")
+    parser.add_argument("--output", default="bench_results.json", help="results file to write")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed regression as a fraction (default 0.2)")
+    args = parser.parse_args(argv)
+
+    results = run(args.versions.split(","), [int(s) for s in args.sizes.split(",")],
+                  args.iterations, args.max_seconds)
+    with open(args.output, "w") as f:
+        json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
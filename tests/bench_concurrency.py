@@ -0,0 +1,158 @@
+"""Concurrent-connection benchmark: WSGI (gthread) versus ASGI (event loop).
+
+Starts the v1.3 app once per serving mode, opens N slow clients that trickle
+their request headers in over ``--trickle`` seconds (like mobile clients on
+poor links) and, while they are connected, times fast ``/health`` probes::
+
+    python tests/bench_concurrency.py --connections 10,100,1000 --output bench_concurrency.json
+
+A mode keeps up with N connections when every slow client is answered and
+the probes stay fast; under thread-per-request serving the probes queue
+behind the slow clients once N exceeds the worker threads.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+from bench_api import percentile  # noqa: E402
+from test_api import APP_DIR  # noqa: E402
+
+V13 = APP_DIR / "ACEest_Fitness-V1.3.py"
+MODES = {"wsgi": "production", "asgi": "async"}
+DEFAULT_CONNECTIONS = [10, 100, 1000]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode: str, port: int, workers: int, threads: int) -> subprocess.Popen:
+    env = dict(os.environ, ACEEST_SERVER=MODES[mode], WEB_CONCURRENCY=str(workers),
+               ACEEST_THREADS=str(threads), PORT=str(port))
+    if workers > 1:
+        env.setdefault("ACEEST_DB_PATH", os.path.join(os.environ.get("TMPDIR", "/tmp"), f"bench_{port}.db"))
+    proc = subprocess.Popen([sys.executable, str(V13)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while True:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+            return proc
+        except OSError:
+            if time.time() > deadline or proc.poll() is not None:
+                proc.kill()
+                raise RuntimeError(f"{mode} server did not start")
+            time.sleep(0.1)
+
+
+async def _read_status(reader: asyncio.StreamReader) -> int:
+    line = await reader.readline()
+    return int(line.split()[1])
+
+
+async def slow_client(port: int, trickle: float, steps: int = 10) -> bool:
+    """Send ``GET /stats`` with its headers spread over ``trickle`` seconds; True if answered 200."""
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        return False
+    try:
+        writer.write(b"GET /stats HTTP/1.1\r\nHost: bench\r\n")
+        for i in range(steps):
+            await asyncio.sleep(trickle / steps)
+            writer.write(f"X-Slow-{i}: 1\r\n".encode())
+            await writer.drain()
+        writer.write(b"Connection: close\r\n\r\n")
+        await writer.drain()
+        return await asyncio.wait_for(_read_status(reader), timeout=30) == 200
+    except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
+
+
+async def probe(port: int, until: float, timeout: float) -> Dict:
+    """Issue fast ``/health`` requests back to back until ``until``; return latency stats."""
+    samples: List[float] = []
+    timeouts = 0
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+            writer.write(b"GET /health HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+            await asyncio.wait_for(_read_status(reader), timeout)
+            writer.close()
+            samples.append(time.perf_counter() - start)
+        except (OSError, asyncio.TimeoutError):
+            timeouts += 1
+        await asyncio.sleep(0.01)
+    samples.sort()
+    return {
+        "probes": len(samples),
+        "probe_timeouts": timeouts,
+        "probe_p50_ms": round(percentile(samples, 0.50) * 1000, 3) if samples else None,
+        "probe_p99_ms": round(percentile(samples, 0.99) * 1000, 3) if samples else None,
+    }
+
+
+async def load(port: int, connections: int, trickle: float, probe_timeout: float) -> Dict:
+    start = time.perf_counter()
+    clients = [asyncio.create_task(slow_client(port, trickle)) for _ in range(connections)]
+    probes = await probe(port, start + trickle, probe_timeout)
+    answered = sum(await asyncio.gather(*clients))
+    return {"answered": answered, "failed": connections - answered,
+            "seconds": round(time.perf_counter() - start, 3), **probes}
+
+
+def run(modes: List[str], connections: List[int], trickle: float, workers: int, threads: int,
+        probe_timeout: float = 2.0) -> List[Dict]:
+    results = []
+    for mode in modes:
+        port = _free_port()
+        proc = start_server(mode, port, workers, threads)
+        try:
+            for n in connections:
+                result = {"mode": mode, "connections": n, **asyncio.run(load(port, n, trickle, probe_timeout))}
+                results.append(result)
+                print(f"{mode:5} {n:>6} conns  answered {result['answered']:>6}  "
+                      f"probe p50 {result['probe_p50_ms']} ms  p99 {result['probe_p99_ms']} ms  "
+                      f"timeouts {result['probe_timeouts']}", flush=True)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated serving modes")
+    parser.add_argument("--connections", default=",".join(map(str, DEFAULT_CONNECTIONS)),
+                        help="comma-separated slow-connection counts")
+    parser.add_argument("--trickle", type=float, default=2.0, help="seconds each slow client takes to send headers")
+    parser.add_argument("--workers", type=int, default=1, help="WEB_CONCURRENCY for both modes")
+    parser.add_argument("--threads", type=int, default=4, help="ACEEST_THREADS for both modes")
+    parser.add_argument("--output", default="bench_concurrency.json", help="results file to write")
+    args = parser.parse_args(argv)
+
+    results = run(args.modes.split(","), [int(n) for n in args.connections.split(",")],
+                  args.trickle, args.workers, args.threads)
+    with open(args.output, "w") as f:
+        json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Serialization microbenchmarks for the v1.3 routes.
+
+Captures each route's real response payload from a pre-filled store, then
+times encoding it with every JSON codec the app has (``JSON_CODECS``)::
+
+    python tests/bench_json.py --size 10000 --output bench_json.json
+
+Static routes (``/``, ``/version``) are encoded once at startup, so their
+per-request serialization cost is zero; they are listed for comparison.
+"""
+import argparse
+import json
+import pathlib
+import platform
+import sys
+import timeit
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+from bench_api import prefill  # noqa: E402
+from test_api import APP_DIR, _load_module  # noqa: E402
+
+V13 = APP_DIR / "ACEest_Fitness-V1.3.py"
+
+# (name, request factory); each response body is decoded back into the payload to encode
+ROUTES = [
+    ("GET /", lambda c: c.get("/")),
+    ("GET /version", lambda c: c.get("/version")),
+    ("GET /bmi", lambda c: c.get("/bmi?height_cm=180&weight_kg=81")),
+    ("GET /stats", lambda c: c.get("/stats")),
+    ("GET /summary", lambda c: c.get("/summary")),
+    ("GET /workouts", lambda c: c.get("/workouts")),
+    ("GET /members/<id>/stats", lambda c: c.get("/members/M-1/stats")),
+    ("GET /calories", lambda c: c.get("/calories")),
+    ("POST /workouts", lambda c: c.post("/workouts", json={"type": "Run", "minutes": 30, "member_id": "M-1"})),
+    ("POST /workouts/batch", lambda c: c.post("/workouts/batch", json=[{"type": "Run", "minutes": 5}] * 100)),
+]
+STATIC = {"GET /", "GET /version"}
+
+
+def payloads(size: int) -> Tuple[object, Dict[str, object]]:
+    """Return the loaded app module and each route's decoded response body."""
+    mod = _load_module(V13)
+    prefill(mod, size)
+    client = mod.app.test_client()
+    client.post("/workouts", json={"type": "Run", "minutes": 30, "member_id": "M-1"})
+    return mod, {name: json.loads(request(client).data) for name, request in ROUTES}
+
+
+def ns_per_call(fn, *args, number: Optional[int] = None, repeat: int = 5) -> float:
+    timer = timeit.Timer(lambda: fn(*args))
+    if number is None:
+        number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def run(size: int, number: Optional[int] = None, repeat: int = 5) -> List[Dict]:
+    mod, bodies = payloads(size)
+    results = []
+    for name, body in bodies.items():
+        row = {"route": name, "bytes": len(mod._dumps(body)), "static": name in STATIC}
+        for codec, (dumps, _) in mod.JSON_CODECS.items():
+            row[f"{codec}_ns"] = round(ns_per_call(dumps, body, True, number=number, repeat=repeat), 1)
+        results.append(row)
+        timings = "  ".join(f"{k[:-3]} {v:>10.1f} ns" for k, v in row.items() if k.endswith("_ns"))
+        print(f"{name:26} {row['bytes']:>7} B  {timings}{'  (pre-encoded)' if row['static'] else ''}", flush=True)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10000, help="workouts to pre-fill")
+    parser.add_argument("--output", default="bench_json.json", help="results file to write")
+    args = parser.parse_args(argv)
+
+    results = run(args.size)
+    with open(args.output, "w") as f:
+        json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Cold-start time and per-instance memory of the v1.3 app factory.
+
+Cold start runs in a fresh interpreter per sample and splits the time into
+importing the module, ``create_app()`` and the first request. Per-instance
+memory builds several apps in one process and reports the traced allocation
+each one adds, empty and with ``--size`` workouts::
+
+    python tests/bench_startup.py --samples 5 --instances 20 --size 100000
+
+Use the numbers to size pods: baseline RSS plus instances x per-instance cost.
+"""
+import argparse
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tracemalloc
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+from bench_api import prefill  # noqa: E402
+from test_api import APP_DIR, _load_module  # noqa: E402
+
+V13 = APP_DIR / "ACEest_Fitness-V1.3.py"
+
+# runs in a fresh interpreter; prints one JSON line
+COLD_START = """
+import importlib.util, json, resource, sys, time
+t0 = time.perf_counter()
+spec = importlib.util.spec_from_file_location("aceest_app", sys.argv[1])
+mod = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mod)
+t1 = time.perf_counter()
+app = mod.create_app()
+t2 = time.perf_counter()
+app.test_client().get("/health")
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000, "create_app_ms": (t2 - t1) * 1000, "first_request_ms": (t3 - t2) * 1000,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "numpy_loaded": "numpy" in sys.modules,
+}))
+"""
+
+
+def cold_start(samples: int) -> Dict:
+    runs = []
+    for _ in range(samples):
+        out = subprocess.run([sys.executable, "-c", COLD_START, str(V13)], check=True,
+                             capture_output=True, text=True).stdout
+        runs.append(json.loads(out.splitlines()[-1]))
+    result = {key: round(statistics.median(r[key] for r in runs), 2)
+              for key in ("import_ms", "create_app_ms", "first_request_ms", "max_rss_kb")}
+    result["numpy_loaded"] = any(r["numpy_loaded"] for r in runs)
+    return result
+
+
+def per_instance(instances: int, size: int) -> Dict:
+    mod = _load_module(V13)
+    apps = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(instances):
+        apps.append(mod.create_app({"ACEEST_STORE": "memory", "WEB_CONCURRENCY": 1}))
+    empty = (tracemalloc.get_traced_memory()[0] - before) / instances
+    for app in apps:
+        store = app.extensions["aceest"].workouts
+        prefill(type("Instance", (), {"workouts": store}), size)
+    filled = (tracemalloc.get_traced_memory()[0] - before) / instances
+    tracemalloc.stop()
+    return {"instances": instances, "size": size,
+            "empty_kb": round(empty / 1024, 1), "filled_kb": round(filled / 1024, 1)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--instances", type=int, default=20, help="apps to build for the memory figure")
+    parser.add_argument("--size", type=int, default=100000, help="workouts per instance when filled")
+    parser.add_argument("--output", default="bench_startup.json", help="results file to write")
+    args = parser.parse_args(argv)
+
+    start = cold_start(args.samples)
+    print(f"cold start: import {start['import_ms']} ms  create_app {start['create_app_ms']} ms  "
+          f"first request {start['first_request_ms']} ms  max RSS {start['max_rss_kb']} KiB  "
+          f"numpy loaded: {start['numpy_loaded']}")
+    memory = per_instance(args.instances, args.size)
+    print(f"per instance: {memory['empty_kb']} KiB empty, {memory['filled_kb']} KiB with {args.size} workouts")
+    with open(args.output, "w") as f:
+        json.dump({"python": platform.python_version(), "cold_start": start, "per_instance": memory}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,17 @@
 
+import hashlib
 import importlib.util
+import os
 import pathlib
 import json
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
 
 import pytest
 
@@ -18,11 +28,14 @@ VERSION_FILES = [
     "ACEest_Fitness-V1.3.py",
 ]
 
-def _load_app(module_path: pathlib.Path):
+def _load_module(module_path: pathlib.Path):
     spec = importlib.util.spec_from_file_location("aceest_app", str(module_path))
     mod = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(mod)  # type: ignore
-    return getattr(mod, "app")
+    return mod
+
+def _load_app(module_path: pathlib.Path):
+    return getattr(_load_module(module_path), "app")
 
 @pytest.mark.parametrize("fname", VERSION_FILES)
 def test_health_and_home(fname):
@@ -87,3 +100,981 @@ def test_stats(fname):
     data = res.get_json()
     assert data["total_minutes"] == 50
     assert data["by_type"]["Run"] == 30
+
+V13 = APP_DIR / "ACEest_Fitness-V1.3.py"
+
+def test_aggregates_match_across_endpoints():
+    app = _load_app(V13)
+    client = app.test_client()
+
+    for kind, minutes in [("Run", 30), ("Bike", 20), ("Run", 15)]:
+        client.post("/workouts", json={"type": kind, "minutes": minutes})
+    client.post("/workouts", json={"type": "Run", "minutes": 0})  # rejected
+
+    data = client.get("/stats").get_json()
+    assert data == {"count": 3, "total_minutes": 65, "by_type": {"Run": 45, "Bike": 20}}
+    assert "Workouts: 3 | Total minutes: 65" in client.get("/summary").get_json()["summary"]
+    body = client.get("/metrics").data.decode()
+    assert "aceest_workouts_total 3" in body and "aceest_minutes_total 65" in body
+
+def test_workouts_cursor_pagination():
+    app = _load_app(V13)
+    client = app.test_client()
+    for i in range(5):
+        client.post("/workouts", json={"type": "Run", "minutes": i + 1})
+
+    page = client.get("/workouts?limit=2").get_json()
+    assert page["count"] == 5
+    assert [w["minutes"] for w in page["items"]] == [1, 2]
+    seen = [w["minutes"] for w in page["items"]]
+    while page["next_cursor"] is not None:
+        page = client.get(f"/workouts?limit=2&cursor={page['next_cursor']}").get_json()
+        seen += [w["minutes"] for w in page["items"]]
+    assert seen == [1, 2, 3, 4, 5]
+
+    assert client.get("/workouts?cursor=-1").status_code == 400
+    assert client.get("/workouts?limit=abc").status_code == 400
+
+def test_workouts_ndjson_stream():
+    app = _load_app(V13)
+    client = app.test_client()
+    for kind in ("Run", "Bike", "Swim"):
+        client.post("/workouts", json={"type": kind, "minutes": 10})
+
+    res = client.get("/workouts?format=ndjson&cursor=1")
+    assert res.status_code == 200
+    assert res.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in res.data.decode().splitlines()]
+    assert [w["type"] for w in lines] == ["Bike", "Swim"]
+
+def test_workouts_batch_json_and_ndjson():
+    app = _load_app(V13)
+    client = app.test_client()
+
+    res = client.post("/workouts/batch", json=[
+        {"type": "Run", "minutes": 30},
+        {"type": "", "minutes": 10},
+        {"type": "Bike", "minutes": "x"},
+        {"type": "Bike", "minutes": 20},
+    ])
+    assert res.status_code == 201
+    data = res.get_json()
+    assert (data["added"], data["rejected"]) == (2, 2)
+    assert [r["ok"] for r in data["results"]] == [True, False, False, True]
+    assert data["results"][1]["error"] == "type is required"
+
+    body = '{"type": "Swim", "minutes": 5}\nnot json\n{"type": "Swim", "minutes": 7}\n'
+    res = client.post("/workouts/batch", data=body, content_type="application/x-ndjson")
+    assert res.get_json()["added"] == 2
+
+    stats = client.get("/stats").get_json()
+    assert stats["count"] == 4
+    assert stats["by_type"] == {"Run": 30, "Bike": 20, "Swim": 12}
+
+    assert client.post("/workouts/batch", json={"type": "Run"}).status_code == 400
+    res = client.post("/workouts", json={"type": "x" * 70000, "minutes": 5})
+    assert res.status_code == 400 and res.get_json()["error"] == "type must be at most 64 characters"
+
+def test_columnar_store():
+    mod = _load_module(V13)
+    mod.RANGE_CHUNK = 3  # ranges span several chunks
+    store = mod.WorkoutStore()
+    for i, (kind, minutes) in enumerate([("Run", 30), ("Bike", 20), ("Run", 15), ("Swim", 5)]):
+        store.append(kind, minutes, 1000.0 + i)
+
+    assert len(store) == 4
+    assert store.get(2) == {"type": "Run", "minutes": 15, "timestamp": "1970-01-01T00:16:42+00:00", "member_id": None, "calories": 91.88}
+    assert [(w["type"], w["minutes"]) for w in store.slice(1, 3)] == [("Bike", 20), ("Run", 15)]
+    assert list(store)[-1]["type"] == "Swim"
+    assert [w["minutes"] for w in store.iter_range(1, 10)] == [20, 15, 5]
+    assert store.aggregate() == {"count": 4, "total_minutes": 70, "by_type": {"Run": 45, "Bike": 20, "Swim": 5}}
+    assert store.aggregate(1001.0, 1003.0) == {"count": 2, "total_minutes": 35, "by_type": {"Bike": 20, "Run": 15}}
+    # types are interned: one table entry per distinct type
+    assert store._types == ["Run", "Bike", "Swim"]
+    # a day's rollup holds only the types seen that day
+    store.append("Yoga", 25, 86400.0)
+    assert store._days[1.0][2] == {3: 25} and store.daily(0, 2)[1]["by_type"] == {"Yoga": 25}
+
+def test_time_index_buffers_late_entries(monkeypatch):
+    mod = _load_module(V13)
+    monkeypatch.setattr(mod, "LATE_INDEX_SIZE", 8)
+    store = mod.WorkoutStore()
+    rng = random.Random(7)
+    stamps = [rng.uniform(0, 1000) for _ in range(50)]
+    for i, ts in enumerate(stamps):
+        store.append("Run", i + 1, ts)
+    # a None timestamp is stamped by the store, after every client timestamp here
+    store.extend([("Bike", 1, None, "")])
+    snap = store.snapshot()
+    assert 0 < len(snap.late_ts) < 8 and snap.indexed + len(snap.late_ts) == 51
+
+    expected = sorted(range(50), key=lambda i: (stamps[i], i))
+    window = [i for i in expected if 200 <= stamps[i] < 700]
+    assert store.count_between(200, 700) == len(window)
+    assert [w["minutes"] for w in store.iter_between(200, 700, 3, 10)] == [i + 1 for i in window[3:13]]
+    assert store.aggregate(200, 700)["total_minutes"] == sum(i + 1 for i in window)
+    assert [w["minutes"] for w in store.iter_between(None, None, 0, None)] == [i + 1 for i in expected] + [1]
+
+def test_concurrent_writes_and_stats_stay_consistent():
+    app = _load_app(V13)
+    writers, readers, per_writer = 4, 4, 200
+    errors = []
+    done = threading.Event()
+
+    def write(kind):
+        client = app.test_client()
+        for _ in range(per_writer):
+            if client.post("/workouts", json={"type": kind, "minutes": 1}).status_code != 201:
+                errors.append("post failed")
+
+    def read():
+        client = app.test_client()
+        while not done.is_set():
+            data = client.get("/stats").get_json()
+            # every write adds one minute, so a consistent view has count == minutes
+            if not (data["count"] == data["total_minutes"] == sum(data["by_type"].values())):
+                errors.append(data)
+
+    threads = [threading.Thread(target=write, args=(f"T{i}",)) for i in range(writers)]
+    reader_threads = [threading.Thread(target=read) for _ in range(readers)]
+    for t in reader_threads + threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done.set()
+    for t in reader_threads:
+        t.join()
+
+    assert errors == []
+    data = app.test_client().get("/stats").get_json()
+    assert data["count"] == writers * per_writer
+    assert data["by_type"] == {f"T{i}": per_writer for i in range(writers)}
+
+def test_durable_log_survives_restart(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACEEST_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("ACEEST_FSYNC", "always")
+    mod = _load_module(V13)
+    client = mod.app.test_client()
+    client.post("/workouts", json={"type": "Run", "minutes": 30})
+    client.post("/workouts/batch", json=[{"type": "Bike", "minutes": 20}, {"type": "Run", "minutes": 5}])
+    mod.workouts.log.close()
+
+    # simulate a crash mid-write: a torn record at the tail is dropped on recovery
+    seg = tmp_path / "workouts.seg"
+    with open(seg, "ab") as f:
+        f.write(b"\x10\x00\x00\x00garbage")
+
+    restarted = _load_module(V13)
+    data = restarted.app.test_client().get("/stats").get_json()
+    assert data == {"count": 3, "total_minutes": 55, "by_type": {"Run": 35, "Bike": 20}}
+    restarted.app.test_client().post("/workouts", json={"type": "Swim", "minutes": 10})
+    restarted.workouts.log.close()
+    assert len(_load_module(V13).workouts) == 4
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_recovery_bulk_load_matches_live_writes(vectorized, tmp_path, monkeypatch):
+    mod = _load_module(V13)
+    if not vectorized:
+        monkeypatch.setattr(mod, "_numpy", lambda: None)
+    log = mod.SegmentLog(str(tmp_path / "workouts.seg"), "off")
+    log.replay()
+    live = mod.WorkoutStore()
+    live.log = log
+    live._weights = {"M-1": 90.0}
+    rng = random.Random(3)
+    for i in range(300):
+        # every 7th entry arrives late, across several UTC days
+        ts = 86400 * 3 - i * 1000.0 if i % 7 == 0 else 1000.0 * i
+        live.append(rng.choice(["Run", "Bike", "Yoga"]), rng.randint(1, 60), ts, rng.choice(["", "M-1", "M-2", "M-3"]))
+    log.close()
+
+    recovered = mod.WorkoutStore()
+    recovered._weights = {"M-1": 90.0}
+    log = mod.SegmentLog(str(tmp_path / "workouts.seg"), "off")
+    recovered.load(log.replay())
+    log.close()
+    assert recovered.aggregate() == live.aggregate()
+    assert recovered.aggregate(5000, 150000) == live.aggregate(5000, 150000)
+    assert list(recovered.iter_between(None, None, 0, None)) == list(live.iter_between(None, None, 0, None))
+    assert recovered.daily(0, 5) == live.daily(0, 5)
+    assert recovered.calories() == live.calories()
+    for member in ("M-1", "M-2", "M-3"):
+        assert recovered.member_stats(member) == live.member_stats(member)
+        assert recovered.calories(member) == live.calories(member)
+        assert list(recovered.iter_member(member, 0, 500)) == list(live.iter_member(member, 0, 500))
+
+def test_sqlite_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACEEST_STORE", "sqlite")
+    monkeypatch.setenv("ACEEST_DB_PATH", str(tmp_path / "workouts.db"))
+    mod = _load_module(V13)
+    assert isinstance(mod.workouts, mod.SQLiteStore)
+    client = mod.app.test_client()
+
+    client.post("/workouts", json={"type": "Run", "minutes": 30})
+    res = client.post("/workouts/batch", json=[{"type": "Bike", "minutes": 20}, {"type": "Run", "minutes": 5}])
+    assert res.get_json()["added"] == 2
+
+    page = client.get("/workouts?limit=2&cursor=1").get_json()
+    assert page["count"] == 3
+    assert [(w["type"], w["minutes"]) for w in page["items"]] == [("Bike", 20), ("Run", 5)]
+    assert page["next_cursor"] is None
+    assert "Workouts: 3 | Total minutes: 55" in client.get("/summary").get_json()["summary"]
+
+    # a thread per request (the dev server) must not keep a connection per request
+    for _ in range(50):
+        thread = threading.Thread(target=client.get, args=("/stats",))
+        thread.start()
+        thread.join()
+    assert len(mod.workouts._pool) <= 2
+    mod.workouts.close()
+
+    restarted = _load_module(V13)
+    data = restarted.app.test_client().get("/stats").get_json()
+    assert data == {"count": 3, "total_minutes": 55, "by_type": {"Run": 35, "Bike": 20}}
+    restarted.workouts.close()
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_bmi_batch(vectorized, monkeypatch):
+    monkeypatch.setenv("ACEEST_JSON", "stdlib")  # parses integers of any size, as when orjson is missing
+    mod = _load_module(V13)
+    if vectorized:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(mod, "_numpy", lambda: None)
+    client = mod.app.test_client()
+
+    res = client.post("/bmi/batch", json={
+        "height_cm": [180, "175", 0, "tall", 160],
+        "weight_kg": [81, 70, 60, 70, None],
+    })
+    assert res.status_code == 200
+    data = res.get_json()
+    assert data["count"] == 5
+    assert data["bmi"] == [25.0, 22.86, None, None, None]
+    assert [row["index"] for row in data["invalid"]] == [2, 3, 4]
+    assert data["invalid"][0]["error"] == "height_cm and weight_kg must be > 0"
+    assert data["invalid"][1]["error"] == "height_cm and weight_kg must be numbers"
+
+    body = '{"height_cm": 180, "weight_kg": 81}\n{"height_cm": -1, "weight_kg": 81}\n'
+    data = client.post("/bmi/batch", data=body, content_type="application/x-ndjson").get_json()
+    assert data["bmi"] == [25.0, None]
+
+    assert client.post("/bmi/batch", json={"height_cm": [1], "weight_kg": []}).status_code == 400
+    # an integer too large for a float (the stdlib codec parses it) is an invalid row
+    body = '{"height_cm": [180, 1%s], "weight_kg": [81, 70]}' % ("0" * 400)
+    data = client.post("/bmi/batch", data=body, content_type="application/json").get_json()
+    assert data["bmi"] == [25.0, None] and [row["index"] for row in data["invalid"]] == [1]
+    # a nested row is one invalid value, not an extra dimension
+    data = client.post("/bmi/batch", json={"height_cm": [[180, 175], [160, 150]], "weight_kg": [81, 70]}).get_json()
+    assert data["bmi"] == [None, None] and [row["index"] for row in data["invalid"]] == [0, 1]
+
+def test_bmi_cache_and_etag():
+    app = _load_app(V13)
+    client = app.test_client()
+
+    first = client.get("/bmi?height_cm=180&weight_kg=81")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"].startswith("public, max-age=")
+    etag = first.headers["ETag"]
+    # normalized inputs hit the same cache entry and ETag
+    second = client.get("/bmi?height_cm=180.0&weight_kg=81")
+    assert second.headers["ETag"] == etag
+    assert second.get_json() == first.get_json()
+
+    res = client.get("/bmi?height_cm=180&weight_kg=81", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.data == b""
+    # an ingress that compresses the response weakens the ETag it passes back
+    assert client.get("/bmi?height_cm=180&weight_kg=81", headers={"If-None-Match": "W/" + etag}).status_code == 304
+
+    body = client.get("/metrics").data.decode()
+    assert "aceest_bmi_cache_hits_total 3" in body
+    assert "aceest_bmi_cache_misses_total 1" in body
+
+def test_multiworker_store_defaults_to_sqlite(tmp_path, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("ACEEST_DB_PATH", str(tmp_path / "shared.db"))
+    mod = _load_module(V13)
+    assert isinstance(mod.workouts, mod.SQLiteStore)
+    mod.workouts.close()
+
+    monkeypatch.setenv("ACEEST_STORE", "memory")
+    with pytest.raises(ValueError):
+        _load_module(V13).create_app()
+
+def test_production_server_shares_state_across_workers(tmp_path):
+    pytest.importorskip("gunicorn")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, ACEEST_SERVER="production", WEB_CONCURRENCY="3", ACEEST_THREADS="2",
+               PORT=str(port), ACEEST_DB_PATH=str(tmp_path / "shared.db"))
+    proc = subprocess.Popen([sys.executable, str(V13)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 20
+        while True:
+            try:
+                urllib.request.urlopen(base + "/health", timeout=1)
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+        for _ in range(30):
+            req = urllib.request.Request(base + "/workouts", data=b'{"type": "Run", "minutes": 2}',
+                                         headers={"Content-Type": "application/json"})
+            assert urllib.request.urlopen(req, timeout=5).status == 201
+        # whichever worker answers, it sees every write and every worker's request counts
+        for _ in range(5):
+            stats = json.loads(urllib.request.urlopen(base + "/stats", timeout=5).read())
+            assert stats == {"count": 30, "total_minutes": 60, "by_type": {"Run": 60}}
+            body = urllib.request.urlopen(base + "/metrics", timeout=5).read().decode()
+            assert 'aceest_http_requests_total{route="/workouts",method="POST",status="201"} 30' in body
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+def test_reload_keeps_durable_memory_store(tmp_path):
+    pytest.importorskip("gunicorn")
+    import signal
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, ACEEST_SERVER="production", WEB_CONCURRENCY="1", PORT=str(port),
+               ACEEST_STORE="memory", ACEEST_DATA_DIR=str(tmp_path))
+    proc = subprocess.Popen([sys.executable, str(V13)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+
+    def stats_after(deadline):
+        while True:
+            try:
+                return json.loads(urllib.request.urlopen(base + "/stats", timeout=1).read())
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    try:
+        stats_after(time.time() + 20)
+        for _ in range(3):
+            req = urllib.request.Request(base + "/workouts", data=b'{"type": "Run", "minutes": 2}',
+                                         headers={"Content-Type": "application/json"})
+            assert urllib.request.urlopen(req, timeout=5).status == 201
+        proc.send_signal(signal.SIGHUP)
+        # the replacement worker replays the log rather than inheriting the master's empty store
+        deadline = time.time() + 20
+        time.sleep(1)
+        assert stats_after(deadline)["count"] == 3
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+def test_prometheus_request_metrics():
+    mod = _load_module(V13)
+
+    @mod.app.get("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    client = mod.app.test_client()
+    for _ in range(3):
+        client.get("/stats")
+    client.get("/bmi?height_cm=0&weight_kg=1")
+    client.get("/boom")
+    client.get("/no/such/path")
+
+    res = client.get("/metrics")
+    assert res.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in res.data.decode().splitlines():
+        if line.startswith("#"):
+            continue
+        name, value = line.rsplit(" ", 1)
+        samples[name] = float(value)
+
+    stats = 'route="/stats",method="GET",status="200"'
+    assert samples[f"aceest_http_requests_total{{{stats}}}"] == 3
+    assert samples[f'aceest_http_request_duration_seconds_bucket{{{stats},le="+Inf"}}'] == 3
+    assert samples[f"aceest_http_request_duration_seconds_count{{{stats}}}"] == 3
+    buckets = [v for k, v in samples.items() if k.startswith("aceest_http_request_duration_seconds_bucket{" + stats)]
+    assert buckets == sorted(buckets)
+    assert samples['aceest_http_requests_total{route="/bmi",method="GET",status="400"}'] == 1
+    assert samples['aceest_http_request_errors_total{route="/boom",method="GET",status="500"}'] == 1
+    assert samples['aceest_http_requests_total{route="<unmatched>",method="GET",status="404"}'] == 1
+
+def test_multiprocess_metrics_merge_and_archive_dead_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACEEST_METRICS_DIR", str(tmp_path))
+    mod = _load_module(V13)
+    assert isinstance(mod.request_metrics, mod.MultiprocessMetrics)
+    width = mod.request_metrics.width
+
+    # a worker that has exited and one that is still running
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    key = json.dumps(["http", "/stats", "GET", 200])
+    for pid, count in [(dead.pid, 2), (os.getppid(), 3)]:
+        other = mod.MmapedSeries(str(tmp_path / f"metrics_{pid}.db"), width)
+        other.add(key, 0, count)
+        other.add(key, 2, count)
+        other.close()
+
+    client = mod.app.test_client()
+    client.get("/stats")
+    series, _ = mod.request_metrics.snapshot()
+    assert series[("/stats", "GET", 200)][0] == 6
+    assert not (tmp_path / f"metrics_{dead.pid}.db").exists()
+    assert (tmp_path / "metrics_archive.db").exists()
+
+    # the dead worker's counts are kept, not double counted, on the next scrape
+    body = client.get("/metrics").data.decode()
+    assert 'aceest_http_requests_total{route="/stats",method="GET",status="200"} 6' in body
+
+def test_mmaped_series_read_stops_at_the_mapped_size(tmp_path):
+    mod = _load_module(V13)
+    path = str(tmp_path / "metrics_1.db")
+    series = mod.MmapedSeries(path, 3)
+    series.add("a", 0, 1.0)
+    series.add("b", 1, 2.0)
+    used = series._used
+    series.close()
+    # as seen by a reader that mapped the file just before the writer grew it and published "c"
+    with open(path, "r+b") as f:
+        f.truncate(used + 12)
+        f.write(mod.MmapedSeries.USED.pack(used + 40))
+    assert mod.MmapedSeries.read(path, 3) == [("a", (1.0, 0.0, 0.0)), ("b", (0.0, 2.0, 0.0))]
+
+def test_benchmark_suite_smoke(tmp_path):
+    import bench_api
+
+    results = bench_api.run([VERSION_FILES[-1]], [100], iterations=5, max_seconds=1.0)
+    assert {r["case"] for r in results} == {case for case, _, _ in bench_api.CASES}
+    assert all(r["samples"] >= 1 and r["p99_ms"] >= r["p50_ms"] for r in results)
+
+    slower = [dict(r, p50_ms=r["p50_ms"] * 2, rps=r["rps"] / 2) for r in results]
+    assert bench_api.compare(results, results, threshold=0.2) == []
+    assert len(bench_api.compare(slower, results, threshold=0.2)) == 2 * len(results)
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_time_window_queries(backend, tmp_path, monkeypatch):
+    monkeypatch.setenv("ACEEST_STORE", backend)
+    monkeypatch.setenv("ACEEST_DB_PATH", str(tmp_path / "workouts.db"))
+    mod = _load_module(V13)
+    client = mod.app.test_client()
+
+    res = client.post("/workouts", json={"type": "Run", "minutes": 30, "timestamp": "2025-01-03T08:00:00"})
+    assert res.get_json()["added"]["timestamp"] == "2025-01-03T08:00:00+00:00"
+    client.post("/workouts/batch", json=[
+        {"type": "Bike", "minutes": 20, "timestamp": "2025-01-05T08:00:00Z"},
+        {"type": "Run", "minutes": 10, "timestamp": "2025-01-01T08:00:00+00:00"},  # arrives late
+        {"type": "Swim", "minutes": 5, "timestamp": 1735891200},  # 2025-01-03T08:00:00Z
+    ])
+    client.post("/workouts", json={"type": "Yoga", "minutes": 15})  # stamped now
+
+    data = client.get("/stats?since=2025-01-02&until=2025-01-05").get_json()
+    assert data == {"count": 2, "total_minutes": 35, "by_type": {"Run": 30, "Swim": 5}}
+    assert client.get("/stats?until=2025-01-02").get_json()["total_minutes"] == 10
+    assert client.get("/stats").get_json()["count"] == 5
+
+    page = client.get("/workouts?since=2025-01-01&until=2026-01-01&limit=2").get_json()
+    assert page["count"] == 4
+    assert [w["type"] for w in page["items"]] == ["Run", "Run"]
+    page = client.get(f"/workouts?since=2025-01-01&until=2026-01-01&limit=2&cursor={page['next_cursor']}").get_json()
+    assert [w["type"] for w in page["items"]] == ["Swim", "Bike"] and page["next_cursor"] is None
+
+    res = client.get("/workouts?since=2025-01-04&format=ndjson")
+    assert [json.loads(line)["type"] for line in res.data.decode().splitlines()] == ["Bike", "Yoga"]
+
+    assert client.get("/stats?since=yesterday").status_code == 400
+    assert client.post("/workouts", json={"type": "Run", "minutes": 5, "timestamp": "soon"}).status_code == 400
+    # timestamps that cannot be rendered back are rejected before they are stored
+    for ts in (1e20, -1e20, "9999-12-31T23:59:59-05:00"):
+        assert client.post("/workouts", json={"type": "Run", "minutes": 5, "timestamp": ts}).status_code == 400
+    body = '{"type": "Run", "minutes": 5, "timestamp": 1%s}' % ("0" * 400)  # too large for a float
+    assert client.post("/workouts", data=body, content_type="application/json").status_code == 400
+    assert client.get("/stats?since=1e20").status_code == 400
+    assert client.get("/stats").get_json()["count"] == 5
+    if backend == "sqlite":
+        mod.workouts.close()
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_member_partitioned_stats(backend, tmp_path, monkeypatch):
+    monkeypatch.setenv("ACEEST_STORE", backend)
+    monkeypatch.setenv("ACEEST_DB_PATH", str(tmp_path / "workouts.db"))
+    client = _load_app(V13).test_client()
+
+    client.post("/workouts", json={"type": "Run", "minutes": 30, "member_id": "M-001"})
+    client.post("/workouts", json={"type": "Bike", "minutes": 10})
+    res = client.post("/workouts/batch", json=[
+        {"type": "Run", "minutes": 15, "member_id": "M-001"},
+        {"type": "Swim", "minutes": 20, "member_id": "M-002"},
+        {"type": "Yoga", "minutes": 5, "member_id": 1},
+    ])
+    assert res.status_code == 201
+
+    stats = client.get("/members/M-001/stats").get_json()
+    assert stats == {"member_id": "M-001", "count": 2, "total_minutes": 45, "by_type": {"Run": 45}}
+    assert client.get("/members/1/stats").get_json()["total_minutes"] == 5
+    assert client.get("/members/nobody/stats").status_code == 404
+
+    page = client.get("/members/M-001/workouts?limit=1").get_json()
+    assert [w["minutes"] for w in page["items"]] == [30] and page["next_cursor"] == 1
+    page = client.get("/members/M-001/workouts?cursor=1").get_json()
+    assert [w["minutes"] for w in page["items"]] == [15] and page["next_cursor"] is None
+    assert page["items"][0]["member_id"] == "M-001"
+    assert client.get("/workouts").get_json()["items"][1]["member_id"] is None
+
+    assert client.post("/workouts", json={"type": "Run", "minutes": 5, "member_id": ""}).status_code == 400
+    assert client.post("/workouts", json={"type": "Run", "minutes": 5, "member_id": "x" * 65}).status_code == 400
+
+    # cursors past SQLite's 64-bit integers are rejected on every backend
+    huge = 10 ** 20
+    for url in (f"/workouts?cursor={huge}", f"/workouts?cursor={huge}&since=0", f"/workouts?limit={huge}&since=0",
+                f"/members/M-001/workouts?cursor={huge}"):
+        assert client.get(url).status_code == 400
+    assert client.get(f"/workouts?cursor={2 ** 63 - 1}").get_json()["items"] == []
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_calories_follow_member_weight(backend, tmp_path, monkeypatch):
+    monkeypatch.setenv("ACEEST_STORE", backend)
+    monkeypatch.setenv("ACEEST_DB_PATH", str(tmp_path / "workouts.db"))
+    client = _load_app(V13).test_client()
+
+    # default weight 70 kg: Workout (MET 6) for 20 min = 6 * 3.5 * 70 / 200 * 20
+    res = client.post("/workouts", json={"type": "Workout", "minutes": 20, "member_id": "M-1"})
+    assert res.get_json()["added"]["calories"] == 147.0
+    client.post("/workouts/batch", json=[
+        {"type": "Cool-down", "minutes": 10, "member_id": "M-1"},
+        {"type": "Run", "minutes": 10, "member_id": "M-2"},  # unknown type: MET 5
+    ])
+    assert client.get("/calories").get_json() == {
+        "total_calories": 238.88, "by_type": {"Workout": 147.0, "Cool-down": 30.62, "Run": 61.25},
+    }
+
+    res = client.post("/calories", json={"member_id": "M-1", "weight_kg": 80})
+    assert res.status_code == 200
+    assert res.get_json() == {
+        "member_id": "M-1", "weight_kg": 80.0, "total_calories": 203.0,
+        "by_type": {"Workout": 168.0, "Cool-down": 35.0},
+    }
+    client.post("/workouts", json={"type": "Workout", "minutes": 10, "member_id": "M-1"})
+    assert client.get("/calories?member_id=M-1").get_json()["by_type"]["Workout"] == 252.0
+    assert client.get("/calories").get_json()["by_type"] == {"Workout": 252.0, "Cool-down": 35.0, "Run": 61.25}
+    items = client.get("/members/M-1/workouts").get_json()["items"]
+    assert [w["calories"] for w in items] == [168.0, 35.0, 84.0]
+
+    assert client.get("/calories?member_id=nobody").status_code == 404
+    assert client.get("/calories?member_id=").status_code == 400
+    assert client.get("/calories?member_id=" + "x" * 200).status_code == 400
+    assert client.post("/calories", json={"member_id": "M-1", "weight_kg": 0}).status_code == 400
+    assert client.post("/calories", json={"weight_kg": 80}).status_code == 400
+
+def test_weight_change_covers_rows_not_yet_in_the_member_index():
+    store = _load_module(V13).WorkoutStore()
+    store.append("Workout", 20, 1000.0, "M-1")
+    add, entered, release = store.members.add, threading.Event(), threading.Event()
+
+    def delayed_add(*args):
+        entered.set()
+        release.wait(5)
+        add(*args)
+
+    store.members.add = delayed_add
+    writer = threading.Thread(target=store.append, args=("Workout", 10, 1001.0, "M-1"))
+    writer.start()
+    assert entered.wait(5)
+    store.set_weight("M-1", 80.0)  # the second row is stored but not in the member index yet
+    release.set()
+    writer.join()
+
+    # 6 MET x 3.5 / 200 x 80 kg = 8.4 kcal per minute
+    assert [w["calories"] for w in store.iter_member("M-1", 0, 10)] == [168.0, 84.0]
+    assert store.calories("M-1")["total_calories"] == store.calories()["total_calories"] == 252.0
+
+def _asgi_request(asgi_app, method, path, body=b"", query=b""):
+    import asyncio
+
+    async def call():
+        sent = []
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": method, "path": path, "query_string": query, "http_version": "1.1",
+                 "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 1)}
+        await asgi_app(scope, receive, send)
+        return sent
+
+    sent = asyncio.run(call())
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_asgi_app_serves_the_same_routes(backend, tmp_path, monkeypatch):
+    monkeypatch.setenv("ACEEST_STORE", backend)
+    monkeypatch.setenv("ACEEST_DB_PATH", str(tmp_path / "workouts.db"))
+    mod = _load_module(V13)
+    asgi = mod.asgi_app
+    assert asgi.offload_all == (backend == "sqlite")
+    # only snapshot reads may run on the event loop
+    assert asgi._offload("GET", "/stats", b"") == (backend == "sqlite")
+    assert asgi._offload("GET", "/stats", b"", b"until=2025-01-02") and asgi._offload("GET", "/workouts", b"", b"limit=5&since=0")
+    assert all(asgi._offload(*route, b"") for route in [
+        ("POST", "/workouts"), ("POST", "/calories"), ("POST", "/reports"), ("GET", "/history/daily")])
+
+    assert _asgi_request(asgi, "GET", "/health") == (200, b"OK")
+    status, body = _asgi_request(asgi, "POST", "/workouts", b'{"type": "Run", "minutes": 30}')
+    assert status == 201
+    assert _asgi_request(asgi, "POST", "/workouts", b'{"minutes": 30}')[0] == 400
+    status, body = _asgi_request(asgi, "GET", "/stats")
+    assert json.loads(body) == {"count": 1, "total_minutes": 30, "by_type": {"Run": 30}}
+    status, body = _asgi_request(asgi, "GET", "/workouts", query=b"format=ndjson")
+    assert [json.loads(line)["minutes"] for line in body.splitlines()] == [30]
+    assert b"Workouts: 1" in _asgi_request(asgi, "GET", "/summary")[1]
+    assert json.loads(_asgi_request(asgi, "GET", "/bmi", query=b"height_cm=180&weight_kg=81")[1])["bmi"] == 25.0
+    assert b'route="/workouts",method="POST",status="201"} 1' in _asgi_request(asgi, "GET", "/metrics")[1]
+
+def test_concurrency_benchmark_smoke():
+    pytest.importorskip("uvicorn")
+    import bench_concurrency
+
+    results = bench_concurrency.run(["wsgi", "asgi"], [8], trickle=0.5, workers=1, threads=2)
+    assert [(r["mode"], r["connections"]) for r in results] == [("wsgi", 8), ("asgi", 8)]
+    asgi = results[1]
+    assert asgi["answered"] == 8 and asgi["probes"] >= 1 and asgi["probe_timeouts"] == 0
+
+def test_stats_stream_pushes_coalesced_deltas(monkeypatch):
+    monkeypatch.setenv("ACEEST_STATS_STREAM_RATE", "10")
+    mod = _load_module(V13)
+    client = mod.app.test_client()
+    client.post("/workouts", json={"type": "Run", "minutes": 30})
+    client.post("/workouts", json={"type": "Bike", "minutes": 20})
+
+    res = client.get("/stats/stream", buffered=False)
+    assert res.mimetype == "text/event-stream"
+    stream = iter(res.response)
+    snapshot = next(stream).decode()
+    assert "event: snapshot" in snapshot
+    assert json.loads(snapshot.split("data: ", 1)[1]) == {"count": 2, "total_minutes": 50,
+                                                          "by_type": {"Run": 30, "Bike": 20}}
+
+    # a burst of writes arrives as one event carrying only the changed totals
+    for _ in range(20):
+        client.post("/workouts", json={"type": "Run", "minutes": 1})
+    delta = next(stream).decode()
+    assert delta.startswith("event: delta\nid: 22\n")
+    assert json.loads(delta.split("data: ", 1)[1]) == {"count": 22, "total_minutes": 70, "by_type": {"Run": 50}}
+    # each stream holds a server thread: one per four threads by default, then 503
+    busy = client.get("/stats/stream", buffered=False)
+    assert busy.status_code == 503 and busy.headers["Retry-After"] == "15"
+    assert client.get("/health").status_code == 200
+    res.close()
+    assert not mod.stats_broadcaster._subscribers
+    again = client.get("/stats/stream", buffered=False)
+    assert again.status_code == 200
+    again.close()
+
+def test_stats_broadcaster_rate_limit_and_slow_subscribers():
+    mod = _load_module(V13)
+    store = mod.WorkoutStore()
+    broadcaster = mod.StatsBroadcaster(store, rate=5)
+    events = []
+    token, _ = broadcaster.subscribe(lambda event: events.append(event) or True)
+    slow, _ = broadcaster.subscribe(lambda event: False)
+
+    deadline = time.time() + 1.0
+    while time.time() < deadline:
+        store.append("Run", 1, time.time())
+        time.sleep(0.005)
+    time.sleep(0.3)
+    assert 2 <= len(events) <= 7
+    last = json.loads(events[-1].decode().split("data: ", 1)[1])
+    assert last["count"] == len(store) and last["by_type"] == {"Run": len(store)}
+    assert broadcaster.subscribed(token) and not broadcaster.subscribed(slow)
+
+def test_asgi_stats_stream():
+    import asyncio
+
+    mod = _load_module(V13)
+    mod.stats_broadcaster.interval = 0.05
+
+    async def call():
+        sent = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 2:
+                mod.workouts.append("Swim", 12, time.time())
+            if len(sent) == 3:
+                disconnect.set()
+
+        scope = {"type": "http", "method": "GET", "path": "/stats/stream", "query_string": b"", "headers": []}
+        await asyncio.wait_for(mod.asgi_app(scope, receive, send), timeout=5)
+        return sent
+
+    sent = asyncio.run(call())
+    assert sent[0]["status"] == 200
+    assert b"event: snapshot" in sent[1]["body"]
+    assert b'"by_type":{"Swim":12}' in sent[2]["body"]
+    assert not mod.stats_broadcaster._subscribers
+
+@pytest.mark.parametrize("codec", ["stdlib", "orjson"])
+def test_json_codecs_and_static_responses(codec, monkeypatch):
+    if codec == "orjson":
+        pytest.importorskip("orjson")
+    monkeypatch.setenv("ACEEST_JSON", codec)
+    mod = _load_module(V13)
+    client = mod.app.test_client()
+
+    res = client.get("/")
+    assert res.data == b'{"app":"ACEest Fitness & Gym","version":"1.3"}'
+    assert res.mimetype == "application/json"
+    info = client.get("/version").get_json()
+    assert info["version"] == "1.3" and info["json"] == codec and info["store"] == "memory"
+    assert client.get("/health").data == b"OK"
+
+    res = client.post("/workouts", json={"type": "Run", "minutes": 30})
+    assert res.data.startswith(b'{"added":{"calories":')  # keys sorted, compact
+    assert client.post("/workouts", data="{not json", content_type="application/json").status_code == 400
+    body = client.get("/workouts?format=ndjson").data
+    assert json.loads(body.splitlines()[0])["minutes"] == 30
+
+def test_unknown_json_codec_is_rejected(monkeypatch):
+    monkeypatch.setenv("ACEEST_JSON", "simplejson")
+    with pytest.raises(ValueError, match="ACEEST_JSON"):
+        _load_module(V13)
+
+def test_json_benchmark_smoke():
+    import bench_json
+
+    results = bench_json.run(size=50, number=10, repeat=1)
+    assert {r["route"] for r in results} == {name for name, _ in bench_json.ROUTES}
+    assert all(r["stdlib_ns"] > 0 and r["bytes"] > 0 for r in results)
+
+def test_create_app_instances_are_isolated(tmp_path):
+    mod = _load_module(V13)
+    first = mod.create_app()
+    second = mod.create_app({"ACEEST_STORE": "sqlite", "ACEEST_DB_PATH": str(tmp_path / "other.db"),
+                             "ACEEST_BMI_CACHE_SIZE": 8})
+    assert second.config["ACEEST_STORE"] == "sqlite"
+
+    first.test_client().post("/workouts", json={"type": "Run", "minutes": 30})
+    assert first.test_client().get("/stats").get_json()["count"] == 1
+    assert second.test_client().get("/stats").get_json()["count"] == 0
+    assert second.test_client().get("/version").get_json()["store"] == "sqlite"
+
+    first.test_client().get("/bmi?height_cm=180&weight_kg=81")
+    assert first.extensions["aceest"].bmi_response.cache_info().currsize == 1
+    assert second.extensions["aceest"].bmi_response.cache_info() == (0, 0, 8, 0)
+    posted = 'route="/workouts",method="POST",status="201"'
+    assert posted in first.test_client().get("/metrics").data.decode()
+    assert posted not in second.test_client().get("/metrics").data.decode()
+    second.extensions["aceest"].workouts.close()
+
+    # the module-level app is a lazily built default instance, separate from both
+    assert mod.app is mod.app and mod.app not in (first, second)
+    assert len(mod.workouts) == 0
+
+def test_startup_benchmark_smoke():
+    import bench_startup
+
+    start = bench_startup.cold_start(samples=1)
+    assert start["import_ms"] > 0 and start["create_app_ms"] > 0
+    assert start["numpy_loaded"] is False  # NumPy is only imported when a vectorized path runs
+    memory = bench_startup.per_instance(instances=2, size=100)
+    assert 0 < memory["empty_kb"] < memory["filled_kb"]
+
+def _load_importable(tmp_path, monkeypatch):
+    """Load v1.3 under a real module name, so render pool processes can import it."""
+    src = tmp_path / "src"
+    src.mkdir()
+    shutil.copy(V13, src / "aceest_app.py")
+    monkeypatch.syspath_prepend(str(src))
+    mod = _load_module(src / "aceest_app.py")
+    monkeypatch.setitem(sys.modules, "aceest_app", mod)
+    return mod
+
+def _poll(client, url, timeout=30.0):
+    deadline = time.time() + timeout
+    while True:
+        res = client.get(url)
+        if res.status_code != 202 or time.time() > deadline:
+            return res
+        time.sleep(0.05)
+
+def test_weekly_report_renders_on_the_pool_and_is_cached(tmp_path, monkeypatch):
+    mod = _load_importable(tmp_path, monkeypatch)
+    client = mod.create_app({"ACEEST_STORE": "memory", "ACEEST_REPORT_DIR": str(tmp_path)}).test_client()
+    for minutes, ts in [(40, "2025-01-06T07:00:00"), (10, "2025-01-08T07:00:00"), (30, "2025-01-13T07:00:00")]:
+        client.post("/workouts", json={"type": "Workout", "minutes": minutes, "timestamp": ts, "member_id": "M-1"})
+
+    res = client.post("/reports", json={"member_id": "M-1", "week": "2025-01-08"})
+    assert res.status_code == 202
+    job = res.get_json()
+    assert job["status"] == "pending" and res.headers["Location"] == job["url"]
+    pdf = _poll(client, job["url"])
+    assert pdf.status_code == 200 and pdf.mimetype == "application/pdf"
+    assert pdf.data.startswith(b"%PDF")
+    assert client.get(job["url"], headers={"If-None-Match": pdf.headers["ETag"]}).status_code == 304
+
+    # unchanged data (a workout in another week does not count) is served from the rendered file
+    client.post("/workouts", json={"type": "Workout", "minutes": 5, "timestamp": "2025-01-20T07:00:00",
+                                   "member_id": "M-1"})
+    again = client.post("/reports", json={"member_id": "M-1", "week": "2025-01-06"})
+    assert again.status_code == 200 and again.get_json() == {**job, "status": "done"}
+    client.post("/workouts", json={"type": "Workout", "minutes": 5, "timestamp": "2025-01-07T07:00:00",
+                                   "member_id": "M-1"})
+    changed = client.post("/reports", json={"member_id": "M-1", "week": "2025-01-06"}).get_json()
+    assert changed["job_id"] != job["job_id"]
+    assert _poll(client, changed["url"]).status_code == 200
+
+    assert client.post("/reports", json={"member_id": "nobody"}).status_code == 404
+    assert client.post("/reports", json={"member_id": "M-1", "week": "next week"}).status_code == 400
+    assert client.get("/reports/" + "0" * 32).status_code == 404
+    assert client.get("/reports/../../etc/passwd").status_code == 404
+
+def test_report_queue_is_bounded(tmp_path):
+    mod = _load_module(V13)
+    client = mod.create_app({"ACEEST_STORE": "memory", "ACEEST_REPORT_DIR": str(tmp_path),
+                             "ACEEST_REPORT_QUEUE": 0}).test_client()
+    client.post("/workouts", json={"type": "Workout", "minutes": 30, "member_id": "M-1"})
+    res = client.post("/reports", json={"member_id": "M-1"})
+    assert res.status_code == 503 and res.headers["Retry-After"] == "1"
+
+def test_progress_chart_is_rendered_once_per_store_version(tmp_path, monkeypatch):
+    mod = _load_importable(tmp_path, monkeypatch)
+    app = mod.create_app({"ACEEST_STORE": "memory"})
+    client = app.test_client()
+    pool = app.extensions["aceest"].render_pool
+    submitted = []
+    submit = pool.submit
+    pool.submit = lambda fn, *args: submitted.append(args) or submit(fn, *args)
+
+    client.post("/workouts", json={"type": "Workout", "minutes": 40, "member_id": "M-1"})
+    res = client.get("/charts/progress.png")
+    assert res.status_code == 202 and res.headers["Retry-After"] == "1"  # the request never waits on the render
+    png = _poll(client, "/charts/progress.png")
+    assert png.status_code == 200 and png.mimetype == "image/png" and png.data.startswith(b"\x89PNG")
+    again = client.get("/charts/progress.png")
+    assert again.data == png.data and len(submitted) == 1  # same version: served from the cache
+    assert client.get("/charts/progress.png", headers={"If-None-Match": png.headers["ETag"]}).status_code == 304
+    assert client.get("/charts/progress.png", headers={"If-None-Match": "W/" + png.headers["ETag"]}).status_code == 304
+
+    client.post("/workouts", json={"type": "Cool-down", "minutes": 10})
+    assert _poll(client, "/charts/progress.png").data != png.data and len(submitted) == 2
+    assert submitted[-1] == ({"Workout": 40, "Cool-down": 10}, "png")
+    svg = _poll(client, "/charts/progress.svg?member_id=M-1")
+    assert svg.mimetype == "image/svg+xml" and submitted[-1] == ({"Workout": 40}, "svg")
+    assert client.get("/charts/progress.svg?member_id=nobody").status_code == 404
+    assert client.get("/charts/progress.gif").status_code == 404
+
+    app.extensions["aceest"].charts.max_pending = 0
+    client.post("/workouts", json={"type": "Workout", "minutes": 5})
+    res = client.get("/charts/progress.png")
+    assert res.status_code == 503 and res.headers["Retry-After"] == "1" and len(submitted) == 3
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_daily_history_rollups(backend, tmp_path):
+    mod = _load_module(V13)
+    client = mod.create_app({"ACEEST_STORE": backend, "ACEEST_DB_PATH": str(tmp_path / "workouts.db")}).test_client()
+    client.post("/workouts/batch", json=[
+        {"type": "Run", "minutes": 30, "timestamp": "2025-01-30T23:59:59"},
+        {"type": "Run", "minutes": 10, "timestamp": "2025-01-31T00:00:00"},
+        {"type": "Yoga", "minutes": 20, "timestamp": "2025-01-31T10:00:00"},
+        {"type": "Run", "minutes": 5, "timestamp": "2025-02-03T10:00:00"},
+    ])
+
+    daily = client.get("/history/daily?from=2025-01-30&to=2025-02-01").get_json()
+    assert daily["items"] == [
+        {"date": "2025-01-30", "count": 1, "total_minutes": 30, "by_type": {"Run": 30}},
+        {"date": "2025-01-31", "count": 2, "total_minutes": 30, "by_type": {"Run": 10, "Yoga": 20}},
+        {"date": "2025-02-01", "count": 0, "total_minutes": 0, "by_type": {}},
+    ]
+    # weeks start on Monday and months on the 1st; the range widens to whole periods
+    weekly = client.get("/history/weekly?from=2025-01-30&to=2025-02-03").get_json()
+    assert (weekly["from"], weekly["to"]) == ("2025-01-27", "2025-02-09")
+    assert [(w["date"], w["count"], w["by_type"]) for w in weekly["items"]] == [
+        ("2025-01-27", 3, {"Run": 40, "Yoga": 20}), ("2025-02-03", 1, {"Run": 5})]
+    monthly = client.get("/history/monthly?from=2025-01-15&to=2025-02-01").get_json()
+    assert [(m["date"], m["total_minutes"]) for m in monthly["items"]] == [("2025-01-01", 60), ("2025-02-01", 5)]
+
+    assert len(client.get("/history/daily").get_json()["items"]) == 30
+    assert client.get("/history/daily?from=2025-02-01&to=2025-01-01").status_code == 400
+    assert client.get("/history/daily?from=2000-01-01&to=2025-01-01").status_code == 400
+    assert client.get("/history/daily?to=yesterday").status_code == 400
+    assert client.get("/history/yearly").status_code == 404
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_idempotency_key_replays_the_original_response(backend, tmp_path):
+    mod = _load_module(V13)
+    app = mod.create_app({"ACEEST_STORE": backend, "ACEEST_DB_PATH": str(tmp_path / "workouts.db")})
+    client = app.test_client()
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/workouts", json={"type": "Run", "minutes": 30}, headers=headers)
+    retry = client.post("/workouts", json={"type": "Run", "minutes": 30}, headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.data == first.data and retry.headers["Idempotent-Replayed"] == "true"
+    assert client.get("/stats").get_json()["count"] == 1
+    assert client.post("/workouts", json={"type": "Run", "minutes": 45}, headers=headers).status_code == 422
+
+    # a rejected request does not use up its key
+    bad = {"Idempotency-Key": "retry-2"}
+    assert client.post("/workouts", json={"type": "Run", "minutes": -1}, headers=bad).status_code == 400
+    assert client.post("/workouts", json={"type": "Run", "minutes": 5}, headers=bad).status_code == 201
+    cache = app.extensions["aceest"].idempotency
+    assert cache.claim("retry-3", hashlib.sha1(b"x").digest()) == ("new", None)  # still being handled
+    assert client.post("/workouts", data="x", headers={"Idempotency-Key": "retry-3"}).status_code == 409
+    assert client.post("/workouts", json={"type": "Run", "minutes": 5}, headers={"Idempotency-Key": ""}).status_code == 400
+    assert client.get("/stats").get_json()["count"] == 2
+
+def test_idempotency_cache_is_bounded_by_ttl_and_capacity(monkeypatch):
+    mod = _load_module(V13)
+    cache = mod.IdempotencyCache(ttl=10, capacity=3)
+    clock = [1000.0]
+    monkeypatch.setattr(mod.time, "monotonic", lambda: clock[0])
+    for i in range(5):
+        cache.claim(f"k{i}", b"f")
+        cache.complete(f"k{i}", b"body")
+    assert list(cache._entries) == ["k2", "k3", "k4"]  # the oldest keys made room
+    assert cache.claim("k4", b"f") == ("replay", b"body")
+    clock[0] += 10
+    assert cache.claim("k4", b"f") == ("new", None)  # expired keys are dropped on the next claim
+    assert list(cache._entries) == ["k4"]
+
+def test_admission_control_sheds_load_but_not_probes(monkeypatch):
+    mod = _load_module(V13)
+    app = mod.create_app({"ACEEST_STORE": "memory", "ACEEST_CLIENT_RATE": 0.001, "ACEEST_CLIENT_BURST": 2,
+                          "ACEEST_CLIENT_HEADER": "X-Forwarded-For", "ACEEST_MAX_IN_FLIGHT": 1})
+    client = app.test_client()
+    a = {"X-Forwarded-For": "10.0.0.1, 172.16.0.1"}
+
+    # per-client token bucket: a burst of 2, then 503 until a token refills
+    assert [client.get("/stats", headers=a).status_code for _ in range(3)] == [200, 200, 503]
+    shed = client.get("/stats", headers=a)
+    assert shed.status_code == 503 and int(shed.headers["Retry-After"]) >= 1
+    assert client.get("/stats", headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 200
+    assert client.get("/health", headers=a).status_code == 200
+
+    # global in-flight limit, checked by the Flask hook and by the ASGI adapter before queueing
+    admission = app.extensions["aceest"].admission
+    assert admission.admit("busy-client") is None  # occupies the only slot
+    other = {"X-Forwarded-For": "10.0.0.3"}
+    assert client.get("/stats", headers=other).status_code == 503
+    assert _asgi_request(mod.AsyncApp(app), "GET", "/stats")[0] == 503
+    assert client.get("/health").status_code == 200
+    admission.release()
+    assert client.get("/stats", headers=other).status_code == 200
+    assert _asgi_request(mod.AsyncApp(app), "GET", "/stats")[0] == 200
+    assert "aceest_requests_shed_total 4" in client.get("/metrics", headers={"X-Forwarded-For": "10.0.0.4"}).data.decode()